@@ -0,0 +1,74 @@
+import io
+import wave
+from dataclasses import dataclass
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def to_wav(pcm, sample_rate=SAMPLE_RATE):
+    """float32 PCM → 16bit 单声道 WAV bytes"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes((pcm * 32767).astype(np.int16).tobytes())
+    return buf.getvalue()
+
+
+def _soundfile(pcm, sample_rate, fmt, subtype, compression):
+    import soundfile
+    buf = io.BytesIO()
+    kwargs = {} if compression is None else {"compression_level": compression}
+    soundfile.write(buf, pcm, sample_rate, format=fmt, subtype=subtype, **kwargs)
+    return buf.getvalue()
+
+
+# 名字与腾讯云 VoiceFormat 一致；压缩格式需 pip install soundfile（libsndfile ≥ 1.1）
+ENCODERS = {
+    "wav": lambda pcm, sr, _: to_wav(pcm, sr),
+    "pcm": lambda pcm, sr, _: (pcm * 32767).astype(np.int16).tobytes(),
+    "ogg-opus": lambda pcm, sr, c: _soundfile(pcm, sr, "OGG", "OPUS", c),
+    "mp3": lambda pcm, sr, c: _soundfile(pcm, sr, "MP3", "MPEG_LAYER_III", c),
+}
+
+
+def encode(pcm, fmt="wav", sample_rate=SAMPLE_RATE, compression=None):
+    """float32 PCM → 上传用的字节；compression 为 0~1 的压缩等级，None 用编码器默认值"""
+    return ENCODERS[fmt](pcm, sample_rate, compression)
+
+
+def from_wav(wav_bytes):
+    """WAV bytes → float32 PCM，仅用于外部输入（基准测试语料等）"""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32) / 32767
+
+
+@dataclass
+class Segment:
+    """录音片段：内部一律传 float32 PCM，只有需要上传的引擎才编码成 WAV
+
+    has_speech 为录音端 VAD 的判定，None 表示未知。
+    """
+    pcm: np.ndarray
+    sample_rate: int = SAMPLE_RATE
+    has_speech: bool = None
+
+    @property
+    def duration(self):
+        return len(self.pcm) / self.sample_rate
+
+    def __len__(self):
+        return len(self.pcm)
+
+    def to_wav(self):
+        return to_wav(self.pcm, self.sample_rate)
+
+    def encode(self, fmt="wav", compression=None):
+        return encode(self.pcm, fmt, self.sample_rate, compression)
+
+    @staticmethod
+    def from_wav(wav_bytes, has_speech=None):
+        return Segment(from_wav(wav_bytes), has_speech=has_speech)
@@ -0,0 +1,64 @@
+"""本地 whisper 串行 vs 批量推理吞吐对比
+
+用法: python bench/bench_batch.py [wav目录] [--model small] [--device cpu] [--n 8]
+不给目录时用合成音频（只比较速度，不看识别结果）。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stt  # noqa: E402
+from audio import Segment  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def _load(path):
+    with open(path, "rb") as f:
+        return Segment.from_wav(f.read())
+
+
+def _synthetic(n, seconds=4.0):
+    rng = np.random.default_rng(0)
+    out = []
+    for i in range(n):
+        t = np.arange(int(seconds * stt.SAMPLE_RATE)) / stt.SAMPLE_RATE
+        audio = 0.2 * np.sin(2 * np.pi * (200 + 40 * i) * t) + 0.02 * rng.standard_normal(len(t))
+        out.append(Segment(audio.astype(np.float32), has_speech=True))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("wav_dir", nargs="?")
+    ap.add_argument("--model", default="small")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--n", type=int, default=8)
+    args = ap.parse_args()
+
+    wavs = [_load(p) for p in sorted(glob.glob(os.path.join(args.wav_dir, "*.wav")))] if args.wav_dir \
+        else _synthetic(args.n)
+    cfg = Config({"stt": {"engine": "local", "local": {"model": args.model, "device": args.device, "language": "zh"}}})
+    stt.preload(cfg)
+    stt.transcribe_local(wavs[0], cfg)  # 预热
+
+    t0 = time.perf_counter()
+    for w in wavs:
+        stt.transcribe_local(w, cfg)
+    serial = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stt._transcribe_batch([w.pcm for w in wavs], cfg)
+    batched = time.perf_counter() - t0
+
+    print(f"segments={len(wavs)} model={args.model} device={args.device}")
+    print(f"serial : {serial:.2f}s  {len(wavs) / serial:.2f} seg/s")
+    print(f"batched: {batched:.2f}s  {len(wavs) / batched:.2f} seg/s  x{serial / batched:.2f}")
+
+
+if __name__ == "__main__":
+    main()
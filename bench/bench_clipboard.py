@@ -0,0 +1,83 @@
+"""剪贴板捕获/粘贴额外延迟：固定 sleep vs 等待剪贴板变化
+
+用法: python bench/bench_clipboard.py [--delays 0.01 0.05 0.2 0.4] [--repeat 20]
+用 FakeClipboard 模拟目标程序响应复制快捷键的耗时（app_delay），统计每次选区捕获和
+每次粘贴给调用方增加的延迟，以及是否拿到了选中文本。
+最后一行是没有选区（复制快捷键不改剪贴板）的情况：两种做法都要等满超时，这段时间按键回调被阻塞。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import output  # noqa: E402
+
+OLD_COPY_SLEEP = 0.15
+OLD_PASTE_SLEEP = 0.1
+
+
+def old_copy(cb):
+    old = cb.paste()
+    cb.send_copy()
+    time.sleep(OLD_COPY_SLEEP)
+    new = cb.paste()
+    return new.strip() or None if new != old else None
+
+
+def old_paste(cb, text):
+    old = cb.paste()
+    cb.copy(text)
+    time.sleep(OLD_PASTE_SLEEP)
+    cb.copy(old)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--delays", type=float, nargs="+", default=[0.01, 0.05, 0.2, 0.4])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    cb = output.FakeClipboard("原内容")
+    output.clipboard = cb
+    print(f"{'app_delay':>9} {'old copy ms':>11} {'hit':>4} {'new copy ms':>11} {'hit':>4} "
+          f"{'old paste ms':>12} {'new paste ms':>12}")
+    for delay in args.delays:
+        cb.app_delay = delay
+        rows = {"old_copy": [], "new_copy": [], "old_paste": [], "new_paste": []}
+        hits = {"old": 0, "new": 0}
+        for i in range(args.repeat):
+            cb.selection = f"选中文本{delay}-{i}-old"
+            t, r = timed(old_copy, cb)
+            rows["old_copy"].append(t)
+            hits["old"] += r == cb.selection
+            time.sleep(delay + 0.01)
+            cb.selection = f"选中文本{delay}-{i}-new"
+            t, r = timed(output.copy_selection, cb.send_copy)
+            rows["new_copy"].append(t)
+            hits["new"] += r == cb.selection
+            time.sleep(delay + 0.01)
+            rows["old_paste"].append(timed(old_paste, cb, "结果")[0])
+            rows["new_paste"].append(timed(output.type_text, "结果", False, lambda _: None)[0])
+        ms = {k: statistics.median(v) * 1000 for k, v in rows.items()}
+        print(f"{delay:>9.2f} {ms['old_copy']:>11.1f} {hits['old']:>4} {ms['new_copy']:>11.1f} {hits['new']:>4} "
+              f"{ms['old_paste']:>12.1f} {ms['new_paste']:>12.1f}")
+    cb.selection = None
+    time.sleep(output.RESTORE_DELAY_SEC + 0.1)  # 等上面粘贴的剪贴板恢复完，免得被当成复制结果
+    old = [timed(old_copy, cb) for _ in range(args.repeat)]
+    new = [timed(output.copy_selection, cb.send_copy) for _ in range(args.repeat)]
+    print(f"{'无选区':>6} {statistics.median(t for t, _ in old) * 1000:>11.1f} "
+          f"{sum(r is None for _, r in old):>4} {statistics.median(t for t, _ in new) * 1000:>11.1f} "
+          f"{sum(r is None for _, r in new):>4}   (hit 列为正确返回 None 的次数)")
+    time.sleep(output.RESTORE_DELAY_SEC + 0.1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""本地 whisper 解码策略对比：延迟和字错率（CER）
+
+语料目录里每个 xxx.wav 配一个同名 xxx.txt 参考文本；文件名形如 会话_01.wav、会话_02.wav 的
+按顺序视为同一次录音切出的连续片段，ctx 策略会把前几段的识别结果作为后一段的 prompt。
+
+策略：
+  baseline  改造前：whisper 默认参数（beam 5）+ 词典 prompt
+  greedy    全部贪心解码
+  beam      全部 beam search
+  adaptive  短句贪心、长句 beam（config 默认）
+  adaptive+ctx  adaptive 再带上同会话前文
+
+用法: python bench/bench_decode.py 语料目录 [--model small --device cpu] [--policies baseline,adaptive+ctx]
+"""
+import argparse
+import collections
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stt  # noqa: E402
+from audio import Segment  # noqa: E402
+from config import Config  # noqa: E402
+
+POLICIES = ["baseline", "greedy", "beam", "adaptive", "adaptive+ctx"]
+
+
+def load_corpus(path):
+    """返回 {会话: [(名字, Segment, 参考文本)]}，会话内按文件名排序"""
+    sessions = collections.defaultdict(list)
+    for wav in sorted(glob.glob(os.path.join(path, "*.wav"))):
+        stem = os.path.splitext(wav)[0]
+        if not os.path.exists(stem + ".txt"):
+            continue
+        with open(wav, "rb") as f:
+            segment = Segment.from_wav(f.read(), has_speech=True)
+        with open(stem + ".txt", encoding="utf-8") as f:
+            ref = f.read().strip()
+        name = os.path.basename(stem)
+        m = re.match(r"(.+)_\d+$", name)
+        sessions[m.group(1) if m else name].append((name, segment, ref))
+    return sessions
+
+
+def _plain(text):
+    """只比较文字：去掉标点空白，繁转简"""
+    return re.sub(r"[\W_]+", "", stt._get_t2s().convert(text)).lower()
+
+
+def edit_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def run(policy, sessions, base):
+    local = dict(base["stt"]["local"], decode=policy.split("+")[0])
+    cfg = Config({**base, "stt": {**base["stt"], "local": local}})
+    latencies, errors, chars = [], 0, 0
+    for items in sessions.values():
+        context = ""
+        for _, segment, ref in items:
+            t0 = time.perf_counter()
+            if policy == "baseline":
+                segments, _ = stt._get_model(cfg).transcribe(
+                    segment.pcm, language=local.get("language", "zh"), initial_prompt=cfg.local_prompt)
+                text = "".join(s.text for s in segments).strip()
+            else:
+                text = stt.transcribe_local(segment, cfg, context if policy.endswith("+ctx") else "")
+            latencies.append(time.perf_counter() - t0)
+            context += stt._normalize(text)
+            errors += edit_distance(_plain(ref), _plain(text))
+            chars += len(_plain(ref))
+    lat = sorted(latencies)
+    return sum(lat), lat[len(lat) // 2], lat[min(len(lat) - 1, int(0.95 * len(lat)))], errors / max(chars, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("corpus")
+    ap.add_argument("--model", default="small")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--policies", default=",".join(POLICIES))
+    ap.add_argument("--beam-above", type=float, default=4.0)
+    ap.add_argument("--dictionary", default="", help="逗号分隔的词典")
+    args = ap.parse_args()
+
+    sessions = load_corpus(args.corpus)
+    n = sum(len(v) for v in sessions.values())
+    if not n:
+        sys.exit("语料目录里没有成对的 wav/txt")
+    seconds = sum(seg.duration for v in sessions.values() for _, seg, _ in v)
+    base = {"stt": {"engine": "local", "local": {
+        "model": args.model, "device": args.device, "language": "zh", "beam_above": args.beam_above,
+        "dictionary": [w for w in args.dictionary.split(",") if w]}}}
+    stt._get_model(Config(base))  # 加载 + 预热不计入
+
+    print(f"{n} 段 / {len(sessions)} 个会话 / {seconds:.0f}s 音频，{args.model}/{args.device}")
+    print(f"{'policy':<14} {'total':>8} {'p50':>7} {'p95':>7} {'RTF':>6} {'CER':>7}")
+    for policy in args.policies.split(","):
+        total, p50, p95, cer = run(policy, sessions, base)
+        print(f"{policy:<14} {total:>7.2f}s {p50:>6.2f}s {p95:>6.2f}s {total / seconds:>6.3f} {cer:>7.2%}")
+
+
+if __name__ == "__main__":
+    main()
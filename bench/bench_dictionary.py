@@ -0,0 +1,118 @@
+"""大词典：挑选和拼音纠错的开销，以及纠错的召回/误改
+
+合成词表：从常用字里随机组 3~6 字的词条（可用 --file 换成自己的词表）。
+句子 = 随机常用字填充 + 1~2 个词条；把词条里 1~2 个字换成同音字（或模糊音字）模拟识别错误。
+  召回  被改错的词条被纠正回来的比例
+  误改  不含错误的句子被改动的比例（填充文字碰巧与某个词条拼音相近时会误改）
+需要 pip install pypinyin。
+
+用法: python bench/bench_dictionary.py [--terms 5000] [--n 2000] [--file 词表.txt]
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dictionary  # noqa: E402
+
+COMMON = (
+    "的一是不了人我在有他这为之大来以个中上们到说国和地也子时道出而要于就下得可你年生自会那后能对着事其里所去行过"
+    "家十用发天如然作方成者多日都三小军二无同么经法当起与好看学进种将还分此心前面又定见只主没公从知全已部开现两长"
+    "本意机力实相想明高期通体工样理点物使加化电数新资向次产些问关外结身最程度位重果提表制使务业计候少战象员革位入"
+    "常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必"
+    "战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联认六共权收证改清美再"
+    "采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温"
+    "传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省"
+    "列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层"
+    "片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严龙飞")
+
+
+def pinyin_groups(chars):
+    """模糊拼音 → 该读音的常用字"""
+    from pypinyin import lazy_pinyin
+    groups = collections.defaultdict(list)
+    for ch in chars:
+        groups[dictionary._fuzzy(lazy_pinyin(ch)[0])].append(ch)
+    return groups
+
+
+def corrupt(rng, word, groups, reading):
+    """把 1~2 个字换成同一模糊读音的其他字；换不了返回 None"""
+    chars = list(word)
+    positions = [i for i, ch in enumerate(chars) if len(groups[reading[ch]]) > 1]
+    if not positions:
+        return None
+    for i in rng.sample(positions, min(len(positions), rng.choice((1, 2)))):
+        chars[i] = rng.choice([c for c in groups[reading[chars[i]]] if c != chars[i]])
+    return "".join(chars)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--terms", type=int, default=5000)
+    ap.add_argument("--n", type=int, default=2000, help="句子数")
+    ap.add_argument("--file", help="自备词表（每行一个词），不给就合成")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    from pypinyin import lazy_pinyin
+    rng = random.Random(args.seed)
+    chars = "".join(dict.fromkeys(COMMON))
+    groups = pinyin_groups(chars)
+    reading = {ch: dictionary._fuzzy(lazy_pinyin(ch)[0]) for ch in chars}
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            words = [line.split("\t")[0].strip() for line in f if line.strip() and not line.startswith("#")]
+    else:
+        words = list(dict.fromkeys("".join(rng.choices(chars, k=rng.randint(3, 6))) for _ in range(args.terms)))
+    profiles = ["code", "email", "chat", "bash"]
+    terms = [dictionary.Term(w, 1.0, frozenset(rng.sample(profiles, rng.randint(0, 1))), i)
+             for i, w in enumerate(words)]
+
+    t0 = time.perf_counter()
+    d = dictionary.Dictionary(terms)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    d.warm()
+    index = time.perf_counter() - t0
+    print(f"{len(d)} 词条：建索引 {build * 1000:.0f}ms，拼音索引 {index * 1000:.0f}ms")
+    print(f"整表拼接 prompt {sum(len(w) + 1 for w in words)} 字 / {len(words)} 个热词 → "
+          f"挑选后 {len(d.select().prompt)} 字 / {d.select().hotwords.count('|')} 个热词")
+
+    titles = [f"{rng.choice(words)} - Visual Studio Code", "收件箱 - Outlook", "Terminal", ""]
+    for w in rng.sample(words, 50):
+        d.observe(w)
+    t0 = time.perf_counter()
+    for i in range(200):
+        d.select(profiles[i % len(profiles)], titles[i % len(titles)])
+    print(f"select  {(time.perf_counter() - t0) / 200 * 1e6:.0f}µs / 次")
+
+    known = set(words)
+    wrong = fixed = changed = clean = 0
+    elapsed = 0.0
+    for _ in range(args.n):
+        filler = ["".join(rng.choices(chars, k=rng.randint(4, 12))) for _ in range(3)]
+        picked = [w for w in rng.sample(words, rng.choice((1, 2))) if dictionary._HAN.fullmatch(w)]
+        noisy = [corrupt(rng, w, groups, reading) if rng.random() < 0.7 else None for w in picked]
+        sentence = filler[0] + "".join(
+            (n or w) + f for w, n, f in zip(picked, noisy, filler[1:] + [""]))
+        t0 = time.perf_counter()
+        out, _ = d.correct(sentence)
+        elapsed += time.perf_counter() - t0
+        if any(noisy):
+            for w, n in zip(picked, noisy):
+                if n and n not in known:
+                    wrong += 1
+                    fixed += w in out
+        else:
+            clean += 1
+            changed += out != sentence
+    print(f"correct {elapsed / args.n * 1e6:.0f}µs / 句（约 {len(sentence)} 字）")
+    print(f"召回 {fixed}/{wrong} = {fixed / max(wrong, 1):.1%}   误改 {changed}/{clean} = {changed / max(clean, 1):.1%}")
+
+
+if __name__ == "__main__":
+    main()
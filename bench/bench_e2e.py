@@ -0,0 +1,231 @@
+"""端到端延迟基准：合成音频 → Recorder → 流水线 → stt.transcribe → llm.polish → output.type_text
+
+用法: python bench/bench_e2e.py [--segments 1 2 4] [--backlog 1 3] [--runs 5] [--out result.json]
+      [--polish session] [--speculative] [--tail 1.5]
+STT 用腾讯云引擎指向本地替身服务，LLM 指向本地 OpenAI 兼容替身，输出用 FakeClipboard 记录。
+音频按 --speed 倍速喂给 Recorder 的回调（替代 sounddevice）。结果按阶段给出 p50/p95/p99，
+并写成 JSON 便于对比不同版本。llm_req / llm_KB 为每个会话的 LLM 请求数和请求体大小。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import llm  # noqa: E402
+import output  # noqa: E402
+import stt  # noqa: E402
+from audio import SAMPLE_RATE  # noqa: E402
+from config import Config  # noqa: E402
+from eval_vad import syllable  # noqa: E402
+from audio import Segment  # noqa: E402
+from fake_servers import FakeLLM, FakeTencentASR, FakeTencentRealtime  # noqa: E402
+from pipeline import Processor  # noqa: E402
+from recorder import BLOCK_SIZE, Recorder  # noqa: E402
+
+STAGES = ("queue", "stt", "llm_queue", "llm", "e2e")
+
+
+class FakeStream:
+    """替代 sd.InputStream：记下回调，由 play() 推送音频"""
+
+    def __init__(self, callback, **_):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+
+def speech(rng, seconds, level=0.1):
+    out, n = [], int(seconds * SAMPLE_RATE)
+    while sum(len(x) for x in out) < n:
+        out.append(syllable(rng, level))
+        out.append(np.zeros(int(rng.uniform(0.02, 0.08) * SAMPLE_RATE)))
+    return np.concatenate(out)[:n]
+
+
+def utterance(rng, segments, tail=0.0):
+    """每段 6.5s 语音 + 1.5s 停顿（触发静音切割），最后一段说完即松开
+
+    tail > 0 时最后一段也说满 6.5s，停 tail 秒再松开：停顿超过切割阈值时最后的语音段在松开前就已切出。
+    """
+    parts = [np.zeros(int(0.3 * SAMPLE_RATE))]
+    for i in range(segments):
+        parts.append(speech(rng, 6.5 if i < segments - 1 or tail else 3.0))
+        if i < segments - 1:
+            parts.append(np.zeros(int(1.5 * SAMPLE_RATE)))
+    parts.append(np.zeros(int(tail * SAMPLE_RATE)))
+    audio = np.concatenate(parts).astype(np.float32)
+    return audio + (0.002 * rng.standard_normal(len(audio))).astype(np.float32)
+
+
+def play(stream, audio, speed):
+    block_sec = BLOCK_SIZE / SAMPLE_RATE / speed
+    t0 = time.perf_counter()
+    for k, i in enumerate(range(0, len(audio) - BLOCK_SIZE + 1, BLOCK_SIZE)):
+        stream.callback(audio[i:i + BLOCK_SIZE, None], BLOCK_SIZE, None, None)
+        wait = t0 + (k + 1) * block_sec - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Bench:
+    def __init__(self, cfg, stream_llm):
+        self.cfg = cfg
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.released = {}
+        self.emitted = {}
+        self.done = threading.Condition(self.lock)
+        pipe = cfg.get("pipeline", {})
+        self.processor = Processor(self.transcribe, self.polish, self.emit,
+                                   stt_workers=pipe.get("stt_workers", 1), llm_workers=pipe.get("llm_workers", 2),
+                                   incremental=stream_llm, polish_mode=pipe.get("polish", "segment"),
+                                   speculative=pipe.get("speculative", False))
+        self.streams = []
+        self.recorder = Recorder(self.processor.on_segment, cfg,
+                                 stream_factory=lambda **kw: self.streams.append(FakeStream(**kw)) or self.streams[-1])
+        output.clipboard = output.FakeClipboard()
+
+    def _mark(self, job, key):
+        with self.lock:
+            self.jobs.setdefault((job.sid, job.seq), {"created": job.created})[key] = time.perf_counter()
+
+    def transcribe(self, job):
+        self._mark(job, "stt_start")
+        if isinstance(job.audio, Segment):
+            text = stt.transcribe(job.audio, self.cfg)
+        else:
+            text = stt.transcribe_stream(job.audio)
+        self._mark(job, "stt_end")
+        return text
+
+    def polish(self, job, on_text):
+        self._mark(job, "llm_start")
+        text = llm.polish(job.text, self.cfg, window_title=job.window_title, on_text=on_text)
+        self._mark(job, "llm_end")
+        return text
+
+    def emit(self, sid, is_terminal, text):
+        output.type_text(text, is_terminal, send_paste=lambda _: None)
+        with self.lock:
+            self.emitted.setdefault(sid, time.perf_counter())
+            self.done.notify_all()
+
+    def session(self, audio, speed):
+        streamer = stt.start_stream(self.cfg)
+        sid = self.processor.begin(window_title="bench", streamer=streamer)
+        self.recorder.start(on_audio=streamer.feed if streamer else None)
+        play(self.streams[0], audio, speed)
+        segment = self.recorder.stop()
+        with self.lock:
+            self.released[sid] = time.perf_counter()
+        self.processor.end(segment)
+        return sid
+
+    def wait(self, sids, timeout=120):
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while not all(s in self.emitted for s in sids) and time.monotonic() < deadline:
+                self.done.wait(0.1)
+
+    def samples(self, sids):
+        out = {k: [] for k in STAGES}
+        for (sid, _), t in self.jobs.items():
+            if sid not in sids or "stt_end" not in t:
+                continue
+            out["queue"].append(t["stt_start"] - t["created"])
+            out["stt"].append(t["stt_end"] - t["stt_start"])
+            if "llm_end" in t:
+                out["llm_queue"].append(t["llm_start"] - t["stt_end"])
+                out["llm"].append(t["llm_end"] - t["llm_start"])
+        out["e2e"] = [self.emitted[s] - self.released[s] for s in sids if s in self.emitted]
+        return out
+
+
+def percentiles(values):
+    if not values:
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"n": len(values), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--backlog", type=int, nargs="+", default=[1, 3])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--speed", type=float, default=4.0, help="音频喂入倍速")
+    ap.add_argument("--stt-latency", type=float, default=0.4)
+    ap.add_argument("--stt-jitter", type=float, default=0.1)
+    ap.add_argument("--llm-latency", type=float, default=0.8)
+    ap.add_argument("--llm-jitter", type=float, default=0.2)
+    ap.add_argument("--stt-workers", type=int, default=1)
+    ap.add_argument("--llm-workers", type=int, default=2)
+    ap.add_argument("--stream", action="store_true", help="LLM 流式输出")
+    ap.add_argument("--engine", default="tencent", choices=["tencent", "tencent_rt"])
+    ap.add_argument("--rt-final-delay", type=float, default=0.1, help="实时识别收到 end 后回最终结果的延迟")
+    ap.add_argument("--polish", default="segment", choices=["segment", "session"], help="逐段润色 / 整段会话润色一次")
+    ap.add_argument("--speculative", action="store_true", help="session 模式下录音中先润色已识别的部分")
+    ap.add_argument("--tail", type=float, default=0.0, help="说完后停多久再松开（超过静音切割阈值时尾段为静音）")
+    ap.add_argument("--out", help="结果 JSON 路径")
+    args = ap.parse_args()
+
+    asr = FakeTencentASR(args.stt_latency, args.stt_jitter)
+    fake_llm = FakeLLM(args.llm_latency, args.llm_jitter)
+    rt = FakeTencentRealtime(final_delay=args.rt_final_delay) if args.engine == "tencent_rt" else None
+    cfg = Config({
+        "stt": {"engine": args.engine, "tencent": {"secret_id": "x", "secret_key": "x", "appid": "1",
+                                                   "endpoint": asr.url, "rt_endpoint": rt.url if rt else ""}},
+        "llm": {"enabled": True, "api_url": fake_llm.url + "/v1/chat/completions", "api_key": "x",
+                "model": "fake", "stream": args.stream,
+                "profiles": {"general": {"prompt": "修正以下语音识别文本的错别字和标点，保持原意不变，只返回修正后的文本："}}},
+        "pipeline": {"stt_workers": args.stt_workers, "llm_workers": args.llm_workers,
+                     "polish": args.polish, "speculative": args.speculative},
+    })
+    stt.preload(cfg)
+    llm.preload(cfg)
+    bench = Bench(cfg, args.stream)
+    rng = np.random.default_rng(0)
+
+    results = []
+    print(f"{'seg':>3} {'backlog':>7} " + " ".join(f"{s + ' p50/p95/p99':>24}" for s in STAGES)
+          + f" {'llm_req':>8} {'llm_KB':>7}")
+    for segments in args.segments:
+        audio = utterance(rng, segments, args.tail)
+        for backlog in args.backlog:
+            requests, received = fake_llm.requests, fake_llm.bytes_received
+            sids = []
+            for _ in range(args.runs):
+                batch = [bench.session(audio, args.speed) for _ in range(backlog)]
+                bench.wait(batch)
+                sids += batch
+            stats = {k: percentiles(v) for k, v in bench.samples(set(sids)).items()}
+            llm_req = (fake_llm.requests - requests) / len(sids)
+            llm_kb = (fake_llm.bytes_received - received) / len(sids) / 1024
+            results.append({"segments": segments, "backlog": backlog, "stages": stats,
+                            "llm_requests_per_session": llm_req, "llm_kb_per_session": llm_kb})
+            cells = [f"{st['p50']:.2f}/{st['p95']:.2f}/{st['p99']:.2f}" if st["n"] else "-"
+                     for st in (stats[k] for k in STAGES)]
+            print(f"{segments:>3} {backlog:>7} " + " ".join(f"{c:>24}" for c in cells)
+                  + f" {llm_req:>8.2f} {llm_kb:>7.2f}")
+
+    report = {"args": vars(args), "results": results,
+              "stt_server": {"connections": asr.connections, "requests": asr.requests, "bytes": asr.bytes_received},
+              "llm_server": {"connections": fake_llm.connections, "requests": fake_llm.requests}}
+    print(json.dumps(report["stt_server"]), json.dumps(report["llm_server"]))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    asr.stop()
+    fake_llm.stop()
+    if rt:
+        rt.stop()
+
+
+if __name__ == "__main__":
+    main()
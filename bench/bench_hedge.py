@@ -0,0 +1,80 @@
+"""STT 对冲：单引擎 vs 主备对冲的延迟分布
+
+两个本地腾讯云替身当作两个地域：主地域偶尔长尾卡顿/报错，备地域稍慢但稳定。
+后半程主地域整体变慢，看主引擎能否按 EWMA 自动切换。
+
+用法: python bench/bench_hedge.py [--n 60] [--stall-rate 0.1] [--stall 4] [--error-rate 0.03]
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stt  # noqa: E402
+from audio import SAMPLE_RATE, Segment  # noqa: E402
+from config import Config  # noqa: E402
+from fake_servers import FakeTencentASR  # noqa: E402
+
+
+def percentiles(values):
+    v = sorted(values)
+    return tuple(v[min(len(v) - 1, int(q * len(v)))] for q in (0.5, 0.95, 0.99)) + (v[-1],)
+
+
+def run(name, cfg, primary, backup, n, slow_after, slow_latency):
+    stt._health.clear()
+    primary.latency = 0.3
+    segment = Segment(np.zeros(2 * SAMPLE_RATE, dtype=np.float32), has_speech=True)
+    before = (primary.requests, backup.requests)
+    latencies, failures, winners = [], 0, collections.Counter()
+    for i in range(n):
+        if i == slow_after:
+            primary.latency = slow_latency
+        order = stt._hedge_order(cfg) or [cfg["stt"]["engine"]]
+        t0 = time.perf_counter()
+        try:
+            stt.transcribe(segment, cfg)
+        except Exception:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+        winners[order[0]] += 1
+    p50, p95, p99, worst = percentiles(latencies)
+    reqs = (primary.requests - before[0], backup.requests - before[1])
+    print(f"{name:<8} {p50:>6.2f} {p95:>6.2f} {p99:>6.2f} {worst:>6.2f} {failures:>5} "
+          f"{reqs[0]:>6} {reqs[1]:>6}   {dict(winners)}")
+    time.sleep(max(primary.stall, 0.5))  # 等被放弃的请求收尾，不影响下一组
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=60)
+    ap.add_argument("--stall-rate", type=float, default=0.1)
+    ap.add_argument("--stall", type=float, default=4.0)
+    ap.add_argument("--error-rate", type=float, default=0.03)
+    ap.add_argument("--slow-latency", type=float, default=1.2, help="后半程主地域的延迟")
+    args = ap.parse_args()
+
+    primary = FakeTencentASR(0.3, 0.05, stall_rate=args.stall_rate, stall=args.stall, error_rate=args.error_rate)
+    backup = FakeTencentASR(0.45, 0.05)
+    tencent = {"secret_id": "x", "secret_key": "x", "endpoint": primary.url, "backup_endpoint": backup.url}
+    single = Config({"stt": {"engine": "tencent", "tencent": tencent}})
+    hedged = Config({"stt": {"engine": "tencent", "tencent": tencent,
+                             "hedge": {"engines": ["tencent", "tencent_backup"], "min_delay": 0.3, "max_delay": 1.5}}})
+
+    print(f"{args.n} 次请求，主地域 {args.stall_rate:.0%} 概率卡 {args.stall}s、{args.error_rate:.0%} 报错，"
+          f"第 {args.n // 2} 次起延迟变为 {args.slow_latency}s")
+    print(f"{'mode':<8} {'p50':>6} {'p95':>6} {'p99':>6} {'max':>6} {'fail':>5} {'主请求':>5} {'备请求':>5}   主引擎选择")
+    for name, cfg in (("single", single), ("hedge", hedged)):
+        run(name, cfg, primary, backup, args.n, args.n // 2, args.slow_latency)
+    print("engine stats:", stt.engine_stats())
+    primary.stop()
+    backup.stop()
+
+
+if __name__ == "__main__":
+    main()
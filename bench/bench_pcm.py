@@ -0,0 +1,62 @@
+"""录音片段交给 STT 的开销：旧的 WAV 往返 vs 直接传 float32 PCM
+
+用法: python bench/bench_pcm.py [--seconds 10 20 60] [--repeat 20]
+旧路径：拼接 → 编码 WAV → 静音检测解码 WAV → 本地引擎再解码 WAV。
+新路径：拼接 → 直接交给引擎（上传类引擎才编码一次 WAV）。
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio import SAMPLE_RATE, Segment, from_wav, to_wav  # noqa: E402
+
+BLOCK = 1024
+
+
+def old_path(chunks):
+    wav = to_wav(np.concatenate(chunks))
+    audio = from_wav(wav)
+    np.sqrt(np.mean(audio ** 2))
+    return from_wav(wav)
+
+
+def new_path(chunks):
+    return Segment(np.concatenate(chunks).reshape(-1)).pcm
+
+
+def measure(fn, chunks, repeat):
+    fn(chunks)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(chunks)
+    elapsed = (time.perf_counter() - t0) / repeat
+    tracemalloc.start()
+    fn(chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, nargs="+", default=[10, 30, 60])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    rng = np.random.default_rng(0)
+    print(f"{'audio':>6} {'old ms':>8} {'new ms':>8} {'old MB':>8} {'new MB':>8}")
+    for sec in args.seconds:
+        n = int(sec * SAMPLE_RATE / BLOCK)
+        chunks = [(0.1 * rng.standard_normal((BLOCK, 1))).astype(np.float32) for _ in range(n)]
+        old_t, old_m = measure(old_path, chunks, args.repeat)
+        new_t, new_m = measure(new_path, chunks, args.repeat)
+        print(f"{sec:>5.0f}s {old_t * 1000:>8.2f} {new_t * 1000:>8.2f} "
+              f"{old_m / 2 ** 20:>8.2f} {new_m / 2 ** 20:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""启动耗时：各模块在全新解释器里的导入耗时，以及 preload 返回前的阻塞时间
+
+运行中的程序启动时会在日志里打印 [启动] import/recorder/listener/tray/stt_ready 各阶段，
+这里不需要麦克风和显示器，只看导入和初始化本身。
+
+用法: python bench/bench_startup.py [--modules stt,llm,...] [--top 8]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODULES = "metrics,config,audio,vad,cancel,pipeline,window,output,recorder,llm,stt,pynput,pystray,PIL.Image,pyautogui"
+
+
+def import_time(module):
+    """返回 (总毫秒, [(累计毫秒, 直接依赖)])；导入失败返回 None"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()[1:]))
+    # 子模块先于父模块输出：module 那一行往前到上一个顶层行为止是它的子树，缩进 2 格的是直接依赖
+    end = max(i for i, (_, name) in enumerate(rows) if name == module)
+    deps = []
+    for ms, name in reversed(rows[:end]):
+        if not name.startswith(" "):
+            break
+        if not name.startswith("   "):
+            deps.append((ms, name.strip()))
+    return rows[end][0], sorted(deps, reverse=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modules", default=MODULES)
+    ap.add_argument("--top", type=int, default=5, help="每个模块列出最慢的几个依赖")
+    args = ap.parse_args()
+
+    print(f"{'module':<12} {'import':>9}  最慢的依赖")
+    for module in args.modules.split(","):
+        result = import_time(module)
+        if result is None:
+            print(f"{module:<12} {'未安装':>8}")
+            continue
+        total, deps = result
+        print(f"{module:<12} {total:>7.0f}ms  " + ", ".join(f"{n} {ms:.0f}" for ms, n in deps[:args.top]))
+
+    import stt
+    from config import Config
+    cfg = Config({"stt": {"engine": "local", "local": {"model": "tiny", "device": "cpu"}}})
+    t0 = time.perf_counter()
+    stt.preload(cfg)
+    print(f"\nstt.preload(local) {(time.perf_counter() - t0) * 1000:.1f}ms 返回，模型在后台加载")
+
+
+if __name__ == "__main__":
+    main()
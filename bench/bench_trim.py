@@ -0,0 +1,110 @@
+"""送识别前的静音裁剪：去掉多少音频、省多少上传、是否切到语音
+
+语料默认合成：0.5s 预录 + 若干句（句间停顿 0.3~2s）+ 0.8~1.5s 切割尾静音，与录音端产出的片段一致。
+给 wav 目录时只统计裁剪量（没有标注）。--model 且装了 faster-whisper 时实测解码耗时。
+
+用法: python bench/bench_trim.py [wav目录] [--n 30] [--mbps 2] [--model tiny --device cpu]
+"""
+import argparse
+import base64
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import vad  # noqa: E402
+from audio import SAMPLE_RATE, Segment, to_wav  # noqa: E402
+from eval_vad import add_noise, synth  # noqa: E402
+
+
+def recorded(rng, snr, kind):
+    """模拟 Recorder 交给 STT 的一段：返回 (带噪音频, 干净音频)"""
+    clean, _ = synth(rng, seconds=rng.uniform(5, 25), level=rng.uniform(0.03, 0.2))
+    tail = np.zeros(int(rng.uniform(0.8, 1.5) * SAMPLE_RATE), dtype=np.float32)
+    pre = np.zeros(int(0.5 * SAMPLE_RATE), dtype=np.float32)
+    clean = np.concatenate([pre, clean, tail])
+    return add_noise(rng, clean, snr, kind), clean
+
+
+def kept_speech(clean, spans):
+    """干净信号的能量有多少落在保留区间内"""
+    total = float(np.sum(clean ** 2))
+    kept = sum(float(np.sum(clean[s:e] ** 2)) for s, e in spans)
+    return kept / total if total else 1.0
+
+
+def upload_bytes(pcm):
+    return len(base64.b64encode(to_wav(pcm)))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("wav_dir", nargs="?")
+    ap.add_argument("--n", type=int, default=30)
+    ap.add_argument("--snr", type=float, default=20)
+    ap.add_argument("--noise", default="hum", choices=["white", "hum"])
+    ap.add_argument("--margin", type=float, default=0.2)
+    ap.add_argument("--max-pause", type=float, default=0.6)
+    ap.add_argument("--mbps", type=float, default=2.0, help="估算上传耗时用的上行带宽")
+    ap.add_argument("--model", help="faster-whisper 模型名，实测解码耗时")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.wav_dir:
+        corpus = []
+        for path in sorted(glob.glob(os.path.join(args.wav_dir, "*.wav"))):
+            with open(path, "rb") as f:
+                corpus.append((Segment.from_wav(f.read()).pcm, None))
+    else:
+        corpus = [recorded(rng, args.snr, args.noise) for _ in range(args.n)]
+    cfg = {"trim": {"margin": args.margin, "max_pause": args.max_pause}}
+
+    model = None
+    if args.model:
+        from faster_whisper import WhisperModel
+        model = WhisperModel(args.model, device=args.device, compute_type="auto")
+        list(model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language="zh")[0])
+
+    def decode(pcm):
+        t0 = time.perf_counter()
+        list(model.transcribe(pcm, language="zh")[0])
+        return time.perf_counter() - t0
+
+    sec_in = sec_out = bytes_in = bytes_out = trim_cpu = dec_in = dec_out = 0.0
+    coverage = []
+    for audio, clean in corpus:
+        t0 = time.process_time()
+        spans = vad.keep_spans(audio, cfg)
+        out, _ = vad.trim(audio, cfg)
+        trim_cpu += time.process_time() - t0
+        sec_in += len(audio) / SAMPLE_RATE
+        sec_out += len(out) / SAMPLE_RATE
+        bytes_in += upload_bytes(audio)
+        bytes_out += upload_bytes(out)
+        if clean is not None:
+            coverage.append(kept_speech(clean, spans))
+        if model:
+            dec_in += decode(audio)
+            dec_out += decode(out)
+
+    link = args.mbps * 1e6 / 8
+    print(f"{len(corpus)} 段，margin={args.margin}s max_pause={args.max_pause}s")
+    print(f"音频     {sec_in:8.1f}s → {sec_out:8.1f}s  (-{1 - sec_out / sec_in:.1%})")
+    print(f"上传     {bytes_in / 1e6:8.2f}MB → {bytes_out / 1e6:8.2f}MB  "
+          f"@{args.mbps}Mbps 每段省 {(bytes_in - bytes_out) / link / len(corpus):.2f}s")
+    print(f"裁剪开销 {trim_cpu * 1000 / sec_in:.2f} ms CPU / 每秒音频")
+    if coverage:
+        print(f"语音保留 平均 {np.mean(coverage):.4f}  最差 {min(coverage):.4f}（干净信号能量占比）")
+    if model:
+        print(f"解码     {dec_in:8.2f}s → {dec_out:8.2f}s  (-{1 - dec_out / dec_in:.1%})  {args.model}/{args.device}")
+    else:
+        print("解码     未测（--model 需要 faster-whisper）；whisper 解码耗时大致与音频时长成正比")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""云端 ASR 上传格式对比：编码耗时 vs 字节数 vs 限速链路上的请求总耗时
+
+对每种 upload_format，用限速的本地腾讯云替身测 transcribe_tencent 的完整耗时（编码 + 上传 + 服务端延迟）。
+压缩格式需要 pip install soundfile（libsndfile ≥ 1.1）。
+
+用法: python bench/bench_upload.py [--seconds 5,20,50] [--mbps 0.5,2,10] [--formats wav,ogg-opus,mp3]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stt  # noqa: E402
+from audio import Segment  # noqa: E402
+from config import Config  # noqa: E402
+from eval_vad import add_noise, synth  # noqa: E402
+from fake_servers import FakeTencentASR  # noqa: E402
+
+
+def _check_decodable(fmt, data, seconds):
+    """压缩结果能被解回来且时长一致"""
+    if fmt not in ("ogg-opus", "mp3"):
+        return True
+    import soundfile
+    pcm, sr = soundfile.read(io.BytesIO(data), dtype="float32")
+    return abs(len(pcm) / sr - seconds) < 0.1
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", default="5,20,50")
+    ap.add_argument("--mbps", default="0.5,2,10", help="上行带宽，逗号分隔")
+    ap.add_argument("--formats", default="wav,pcm,ogg-opus,mp3")
+    ap.add_argument("--latency", type=float, default=0.2, help="替身服务端处理延迟")
+    ap.add_argument("--compression", type=float, help="0~1 压缩等级，默认用编码器默认值")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    server = FakeTencentASR(args.latency, 0.0)
+    formats = args.formats.split(",")
+    print(f"{'audio':>6} {'format':>9} {'KB':>8} {'ratio':>6} {'encode':>8}" +
+          "".join(f" {m + 'Mbps':>9}" for m in args.mbps.split(",")))
+    for seconds in (float(s) for s in args.seconds.split(",")):
+        clean, _ = synth(rng, seconds=seconds, level=0.1)
+        segment = Segment(add_noise(rng, clean, 25, "hum"), has_speech=True)
+        wav_size = len(segment.to_wav())
+        for fmt in formats:
+            tc = {"secret_id": "x", "secret_key": "x", "endpoint": server.url,
+                  "upload_format": fmt, "compression": args.compression}
+            cfg = Config({"stt": {"engine": "tencent", "tencent": tc}})
+            try:
+                t0 = time.perf_counter()
+                data = segment.encode(fmt, args.compression)
+                encode = time.perf_counter() - t0
+            except Exception as e:
+                print(f"{seconds:>5.0f}s {fmt:>9}  不可用: {e}")
+                continue
+            ok = "" if _check_decodable(fmt, data, segment.duration) else "  解码校验失败"
+            row = f"{seconds:>5.0f}s {fmt:>9} {len(data) / 1024:>8.0f} {len(data) / wav_size:>6.0%} {encode * 1000:>6.0f}ms"
+            for mbps in (float(m) for m in args.mbps.split(",")):
+                server.bandwidth = mbps * 1e6 / 8
+                t0 = time.perf_counter()
+                try:
+                    stt.transcribe_tencent(segment, cfg)
+                    row += f" {time.perf_counter() - t0:>8.2f}s"
+                except httpx.TimeoutException:
+                    row += f" {'超时':>7}"
+            print(row + ok)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""跳过 LLM 的离线评估：在标注过的识别文本上统计跳过率和误跳过
+
+标注文件每行 profile<TAB>label<TAB>text，label 为 skip（LLM 润色前后无实质差别）或 llm（需要改写）。
+默认用 bench/data/skip_labels.tsv，判定规则和阈值取 config.example.yaml（或 --config）里的 llm.skip。
+  跳过率    判定为跳过的比例，乘以 --llm-latency 估算省下的等待
+  误跳过    标注为 llm 却被跳过（输出了本该润色的文本），越少越好
+
+用法: python bench/eval_skip.py [标注文件] [--config config.yaml] [--dictionary React,Kiro] [-v]
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import llm  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def load(path):
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            profile, label, text = line.rstrip("\n").split("\t", 2)
+            rows.append((profile, label == "skip", text))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("labels", nargs="?", default=os.path.join(ROOT, "bench", "data", "skip_labels.tsv"))
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.example.yaml"))
+    ap.add_argument("--dictionary", default="", help="逗号分隔的词典，英文词在词典里才允许跳过")
+    ap.add_argument("--llm-latency", type=float, default=1.2, help="每次 LLM 请求的平均耗时（秒）")
+    ap.add_argument("-v", "--verbose", action="store_true", help="逐条打印判定")
+    args = ap.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        raw = yaml.safe_load(f)
+    raw.setdefault("stt", {}).setdefault("local", {})["dictionary"] = [w for w in args.dictionary.split(",") if w]
+    cfg = Config(raw)
+    rows = load(args.labels)
+
+    stats = collections.defaultdict(lambda: collections.Counter())
+    reasons = collections.Counter()
+    t0 = time.perf_counter()
+    for profile, label, text in rows:
+        needed, reason = llm.needs_llm(text, cfg, profile)
+        skip = not needed
+        reasons[reason] += 1
+        for key in (profile, "全部"):
+            s = stats[key]
+            s["n"] += 1
+            s["skip"] += skip
+            s["label_skip"] += label
+            s["hit"] += skip and label
+            s["wrong"] += skip and not label
+        if args.verbose or (skip and not label):
+            mark = "误跳过" if skip and not label else ("跳过" if skip else "请求")
+            print(f"  {mark:<4} {profile:<7} {reason:<6} {text}")
+    gate = (time.perf_counter() - t0) / len(rows)
+
+    print(f"\n{len(rows)} 条，判定 {gate * 1e6:.0f}µs / 条")
+    print(f"{'profile':<8} {'n':>4} {'跳过率':>7} {'可跳过':>7} {'召回':>7} {'误跳过':>6}")
+    for key, s in sorted(stats.items(), key=lambda kv: kv[0] == "全部"):
+        print(f"{key:<8} {s['n']:>4} {s['skip'] / s['n']:>8.0%} {s['label_skip'] / s['n']:>8.0%} "
+              f"{s['hit'] / max(s['label_skip'], 1):>8.0%} {s['wrong']:>6}")
+    total = stats["全部"]
+    print(f"\n原因: " + "  ".join(f"{r} {n}" for r, n in reasons.most_common()))
+    print(f"省下 {total['skip']} 次请求，约 {total['skip'] * args.llm_latency:.0f}s（按每次 {args.llm_latency}s）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""本地替身服务：腾讯云一句话识别 + OpenAI 兼容 chat/completions
+
+延迟按 gauss(latency, jitter) 抽样，另以 stall_rate 的概率额外卡住 stall 秒（模拟长尾）；
+bandwidth（字节/秒）限制请求体的接收速度，模拟慢速上行。
+connections 统计 TCP 连接（即握手）次数，requests 统计请求数，可用来验证连接复用和预热。
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fake, handler):
+        self.fake = fake
+        super().__init__(("127.0.0.1", 0), handler)
+
+    def process_request(self, request, client_address):
+        with self.fake.lock:
+            self.fake.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return  # 客户端超时先断开了
+        super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_):
+        pass
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        bandwidth = self.server.fake.bandwidth
+        if not bandwidth:
+            return self.rfile.read(n) if n else b""
+        # 限速读取，模拟慢速上行（热点、酒店网络）
+        chunks = []
+        while n > 0:
+            chunk = self.rfile.read(min(n, 8192))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            n -= len(chunk)
+            time.sleep(len(chunk) / bandwidth)
+        return b"".join(chunks)
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send(200)
+
+
+class _Fake:
+    def __init__(self, latency, jitter, handler):
+        self.latency = latency
+        self.jitter = jitter
+        self.stall_rate = 0.0
+        self.stall = 0.0
+        self.bandwidth = 0  # 上行字节/秒，0 不限速
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_received = 0
+        self._server = _Server(self, handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def delay(self):
+        extra = self.stall if random.random() < self.stall_rate else 0.0
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)) + extra)
+
+    def count(self, body):
+        with self.lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _TencentHandler(_Handler):
+    def do_POST(self):
+        fake = self.server.fake
+        body = self._body()
+        fake.count(body)
+        fake.delay()
+        if random.random() < fake.error_rate:
+            result = {"Response": {"Error": {"Code": "InternalError", "Message": "injected"}}}
+        else:
+            result = {"Response": {"Result": fake.text(json.loads(body)), "RequestId": str(fake.requests)}}
+        self._send(200, json.dumps(result, ensure_ascii=False).encode())
+
+
+class FakeTencentASR(_Fake):
+    """text(payload) 决定返回的识别结果，默认按音频长度给一句固定文本"""
+
+    def __init__(self, latency=0.3, jitter=0.05, text=None, stall_rate=0.0, stall=0.0, error_rate=0.0):
+        self.text = text or (lambda payload: "今天天气不错，我们去公园散步吧。")
+        self.error_rate = error_rate
+        super().__init__(latency, jitter, _TencentHandler)
+        self.stall_rate = stall_rate
+        self.stall = stall
+
+
+class _LLMHandler(_Handler):
+    def do_POST(self):
+        fake = self.server.fake
+        body = self._body()
+        fake.count(body)
+        req = json.loads(body)
+        reply = fake.reply(req["messages"][-1]["content"])
+        fake.delay()
+        if not req.get("stream"):
+            result = {"choices": [{"message": {"role": "assistant", "content": reply}}]}
+            self._send(200, json.dumps(result, ensure_ascii=False).encode())
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(reply), fake.chunk_chars):
+            delta = {"choices": [{"delta": {"content": reply[i:i + fake.chunk_chars]}}]}
+            self._chunk(f"data: {json.dumps(delta, ensure_ascii=False)}\n\n")
+            time.sleep(fake.token_delay)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, s):
+        data = s.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeLLM(_Fake):
+    """OpenAI 兼容接口；reply(content) 决定回复，默认原样返回；stream 时每 chunk_chars 个字一个事件"""
+
+    def __init__(self, latency=0.5, jitter=0.1, reply=None, token_delay=0.02, chunk_chars=2):
+        self.reply = reply or (lambda content: content)
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        super().__init__(latency, jitter, _LLMHandler)
+
+
+class FakeTencentRealtime:
+    """腾讯云实时识别 websocket 替身（需 websockets）
+
+    每收到 partial_every 帧音频回一个中间结果（text 的前缀，slice_type=1）；收到 end 后
+    等 final_delay 秒回最终结果（slice_type=2 + final=1）。disconnect_after 不为空时收到
+    这么多帧后直接断开，用来模拟网络中断。
+    """
+
+    def __init__(self, text="今天天气不错，我们去公园散步吧。", partial_every=10, final_delay=0.05,
+                 connect_delay=0.0, disconnect_after=None):
+        from websockets.sync.server import serve
+        self.text = text
+        self.partial_every = partial_every
+        self.final_delay = final_delay
+        self.connect_delay = connect_delay
+        self.disconnect_after = disconnect_after
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.frames = 0
+        self._server = serve(self._handle, "127.0.0.1", 0, close_timeout=1)  # 卡住的连接 stop() 时不必等满 10 秒
+        self.url = f"ws://127.0.0.1:{self._server.socket.getsockname()[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _result(self, slice_type, text, final=False):
+        msg = {"code": 0, "message": "success", "voice_id": "fake",
+               "result": {"slice_type": slice_type, "index": 0, "voice_text_str": text}}
+        if final:
+            msg["final"] = 1
+        return json.dumps(msg, ensure_ascii=False)
+
+    def _handle(self, ws):
+        with self.lock:
+            self.connections += 1
+        time.sleep(self.connect_delay)
+        frames = 0
+        for message in ws:
+            if isinstance(message, str):
+                time.sleep(self.final_delay)
+                ws.send(self._result(2, self.text))
+                ws.send(json.dumps({"code": 0, "message": "success", "voice_id": "fake", "final": 1}))
+                return
+            frames += 1
+            with self.lock:
+                self.frames += 1
+            if self.disconnect_after is not None and frames >= self.disconnect_after:
+                ws.close()
+                return
+            if frames % self.partial_every == 0:
+                n = min(len(self.text), frames // self.partial_every)
+                ws.send(self._result(1, self.text[:n]))
+
+    def stop(self):
+        self._server.shutdown()
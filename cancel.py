@@ -0,0 +1,110 @@
+import contextlib
+import threading
+
+
+class Cancelled(Exception):
+    """所属会话已取消（Esc、积压丢弃、对冲输掉）"""
+
+
+class Token:
+    """取消令牌；带 parent 时父令牌取消会连带取消"""
+
+    def __init__(self, parent=None):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.cancelled = False
+        self.reason = ""
+        self._unregister = parent.on_cancel(self.cancel) if parent is not None else None
+
+    def cancel(self, reason=""):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(reason)
+
+    def on_cancel(self, fn):
+        """注册回调 fn(reason)；已取消则立即调用。返回注销函数"""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(fn)
+                return lambda: self._discard(fn)
+        fn(self.reason)
+        return lambda: None
+
+    def detach(self):
+        """不再跟随父令牌；父令牌比子令牌活得久时用完要调用，免得回调越积越多"""
+        if self._unregister:
+            self._unregister()
+            self._unregister = None
+
+    def _discard(self, fn):
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, "token", None)
+
+
+@contextlib.contextmanager
+def bind(token):
+    """让当前线程接下来的 check()/call() 跟随 token"""
+    old = current()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = old
+
+
+def check():
+    token = current()
+    if token is not None and token.cancelled:
+        raise Cancelled(token.reason)
+
+
+def call(fn, *args, cleanup=None, **kwargs):
+    """在后台线程执行阻塞调用（如 HTTP 请求），令牌取消时立即抛 Cancelled
+
+    同步 httpx 请求无法从别的线程打断，被放弃的调用在后台跑完，结果交给 cleanup（如关闭响应）。
+    当前线程没有绑定令牌时直接调用。
+    """
+    token = current()
+    if token is None:
+        return fn(*args, **kwargs)
+    check()
+    done = threading.Event()
+    state = {}
+    lock = threading.Lock()
+
+    def run():
+        with bind(token):
+            try:
+                state["result"] = fn(*args, **kwargs)
+            except BaseException as e:
+                state["error"] = e
+        with lock:
+            abandoned = state.get("abandoned")
+        done.set()
+        if abandoned and cleanup and "result" in state:
+            cleanup(state["result"])
+
+    threading.Thread(target=run, daemon=True).start()
+    unregister = token.on_cancel(lambda _: done.set())
+    done.wait()
+    unregister()
+    with lock:
+        if "result" not in state and "error" not in state:
+            state["abandoned"] = True
+            raise Cancelled(token.reason)
+    if "error" in state:
+        raise state["error"]
+    return state["result"]
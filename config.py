@@ -0,0 +1,98 @@
+import functools
+import logging
+import os
+import re
+import threading
+
+import yaml
+
+from dictionary import Dictionary
+
+log = logging.getLogger("voice")
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+
+
+class Config(dict):
+    """编译后的配置：预编译 auto_match 正则、缓存窗口标题 → profile、建好词典索引
+
+    仍是 dict，按 cfg["stt"] / cfg.get(...) 读取；只有顶层键只读，改配置就重新 load()。
+    """
+
+    def __init__(self, raw):
+        super().__init__(raw or {})
+        llm = self.get("llm", {})
+        self._rules = [(re.compile(r["pattern"], re.IGNORECASE), r["profile"]) for r in llm.get("auto_match", [])]
+        self.dictionary = Dictionary.from_config(self)
+        self.local_prompt, self.hotwords = self.dictionary.select()
+        self.profile_for = functools.lru_cache(maxsize=256)(self._profile_for)
+
+    def _readonly(self, *_, **__):
+        raise TypeError("Config 是只读的")
+
+    __setitem__ = __delitem__ = __ior__ = update = pop = popitem = setdefault = clear = _readonly
+
+    def _profile_for(self, window_title=""):
+        """窗口标题 → (profile 名, prompt)，先匹配先生效"""
+        llm = self.get("llm", {})
+        profiles = llm.get("profiles", {})
+        if window_title:
+            for pattern, name in self._rules:
+                if pattern.search(window_title) and name in profiles:
+                    return name, profiles[name]["prompt"]
+        default = llm.get("default_profile", "general")
+        if default in profiles:
+            return default, profiles[default]["prompt"]
+        return "general", llm.get("prompt", "")
+
+
+def load(path=CONFIG_PATH):
+    with open(path, encoding="utf-8") as f:
+        return Config(yaml.safe_load(f))
+
+
+def changed(old, new, *keys):
+    """按路径比较两个配置的某一节是否变化，如 changed(a, b, "stt", "local")"""
+    for k in keys:
+        old, new = (old or {}).get(k), (new or {}).get(k)
+    return old != new
+
+
+class Watcher:
+    """轮询 config.yaml 的修改时间，变化后重新编译并回调 on_change(old, new)
+
+    解析失败时保留旧配置，只记日志。
+    """
+
+    def __init__(self, cfg, on_change, path=CONFIG_PATH, interval=1.0):
+        self.current = cfg
+        self._on_change = on_change
+        self._path = path
+        self._interval = interval
+        self._mtime = self._stat()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _stat(self):
+        try:
+            return os.stat(self._path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self._interval):
+            mtime = self._stat()
+            if mtime is None or mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            try:
+                new = load(self._path)
+            except Exception as e:
+                log.info(f"[配置] 重新加载失败，沿用旧配置: {e}")
+                continue
+            old, self.current = self.current, new
+            log.info("[配置] 已重新加载")
+            try:
+                self._on_change(old, new)
+            except Exception as e:
+                log.info(f"[配置] 应用失败: {e}")
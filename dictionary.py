@@ -0,0 +1,326 @@
+"""个人大词典：按会话挑出相关词条作为 whisper prompt / 腾讯云热词，识别后按拼音就地纠正同音词
+
+词条来自 stt.local.dictionary（手写的少量词，优先级最高）和 dictionary.file（大词表，可上千条）。
+拼音纠错需要 pip install pypinyin，没装时只挑词、不纠错。
+"""
+import collections
+import functools
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+log = logging.getLogger("voice")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+Selection = collections.namedtuple("Selection", "prompt hotwords")
+
+_HAN = re.compile(r"[一-鿿]+")
+HOTWORD_MAX_LEN = 30  # 腾讯云单个热词的长度上限
+
+# 近期使用：词 → (衰减后的次数, 上次时间)；跨配置重载保留
+_usage = {}
+_usage_lock = threading.Lock()
+_lazy_pinyin = None
+
+
+def _get_pinyin():
+    """pypinyin.lazy_pinyin，没装时返回 None（只提示一次）"""
+    global _lazy_pinyin
+    if _lazy_pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin
+            _lazy_pinyin = lazy_pinyin
+        except ImportError:
+            log.info("[词典] 未安装 pypinyin，跳过拼音纠错（pip install pypinyin）")
+            _lazy_pinyin = False
+    return _lazy_pinyin or None
+
+
+def _fuzzy(syllable):
+    """模糊音：zh/z、ch/c、sh/s、n/l、前后鼻音不区分"""
+    if syllable[:2] in ("zh", "ch", "sh"):
+        syllable = syllable[0] + syllable[2:]
+    elif syllable[:1] == "n":
+        syllable = "l" + syllable[1:]
+    if syllable.endswith("ng"):
+        syllable = syllable[:-1]
+    return syllable
+
+
+@functools.lru_cache(maxsize=65536)
+def _letter_distance(a, b):
+    """两个音节的字母编辑距离；音节只有几百种，结果缓存"""
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def _distance(a, b, limit):
+    """等长音节序列逐音节的字母编辑距离之和，超过 limit 时提前返回 limit + 1
+
+    词条和待查片段字数相同，不必做音节级的插入删除；逐位求和仍满足三角不等式，可用于 BK 树。
+    """
+    total = 0
+    for x, y in zip(a, b):
+        if x != y:
+            total += _letter_distance(x, y)
+            if total > limit:
+                return limit + 1
+    return total
+
+
+class _BKTree:
+    """编辑距离 BK 树：按三角不等式只走 d - tol ~ d + tol 的子树"""
+
+    def __init__(self):
+        self._root = None  # [key, 词, {距离: 子节点}]
+
+    def add(self, key, word):
+        if self._root is None:
+            self._root = [key, word, {}]
+            return
+        node = self._root
+        while True:
+            d = _distance(key, node[0], float("inf"))
+            if d == 0:
+                return  # 同音词条保留先加入（权重高）的
+            if d not in node[2]:
+                node[2][d] = [key, word, {}]
+                return
+            node = node[2][d]
+
+    def search(self, key, tol):
+        """返回距离最近的 (距离, 词)，tol 内没有则返回 None"""
+        best = None
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            d = _distance(key, node[0], tol + max(node[2], default=0))
+            if d <= tol and (best is None or d < best[0]):
+                best = (d, node[1])
+            stack.extend(child for dist, child in node[2].items() if d - tol <= dist <= d + tol)
+        return best
+
+
+@dataclass
+class Term:
+    word: str
+    weight: float
+    profiles: frozenset
+    order: int
+
+
+class Dictionary:
+    """词条索引：小写前缀树用于在文本/窗口标题里找词，拼音 BK 树用于纠错（首次纠错时才构建）"""
+
+    def __init__(self, terms=(), prompt_chars=120, hotwords=128, correct=True, min_chars=3,
+                 half_life=86400.0):
+        self.terms = {}
+        for term in terms:
+            self.terms.setdefault(term.word, term)
+        self._ranked = sorted(self.terms.values(), key=lambda t: (-t.weight, t.order))
+        self._by_profile = collections.defaultdict(list)
+        self._trie = {}
+        for term in self._ranked:
+            for name in term.profiles:
+                self._by_profile[name].append(term)
+            node = self._trie
+            for ch in term.word.lower():
+                node = node.setdefault(ch, {})
+            node[""] = term
+        self._prompt_chars = prompt_chars
+        self._hotwords = hotwords
+        self._correct = correct
+        self._min_chars = min_chars
+        self._half_life = half_life
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg):
+        """stt.local.dictionary 的词权重 2，dictionary.file 里的词权重 1，同权重时靠前的优先"""
+        opts = cfg.get("dictionary") or {}
+        terms = [Term(w, 2.0, frozenset(), i)
+                 for i, w in enumerate(cfg.get("stt", {}).get("local", {}).get("dictionary", []) or []) if w]
+        path = opts.get("file")
+        if path:
+            try:
+                terms += _read_file(os.path.join(APP_DIR, os.path.expanduser(path)), len(terms))
+            except OSError as e:
+                log.info(f"[词典] 读取 {path} 失败: {e}")
+        return cls(terms, opts.get("prompt_chars", 120), opts.get("hotwords", 128),
+                   opts.get("correct", True), opts.get("min_chars", 3), opts.get("usage_half_life", 86400.0))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def find(self, text):
+        """text 中出现的词条（不区分大小写）"""
+        text = text.lower()
+        found = []
+        for i in range(len(text)):
+            node = self._trie
+            for ch in text[i:]:
+                node = node.get(ch)
+                if node is None:
+                    break
+                if "" in node:
+                    found.append(node[""])
+        return found
+
+    # ── 挑选 ──
+
+    def _usage_boost(self, word, now):
+        entry = _usage.get(word)
+        if entry is None:
+            return 0.0
+        count, last = entry
+        return min(3.0, math.log1p(count * 0.5 ** ((now - last) / self._half_life)) * 2)
+
+    def select(self, profile=None, window_title=""):
+        """按 权重 + profile 匹配 + 标题里出现 + 近期用过 排序，截取到 prompt 字数和热词个数的上限
+
+        只给可能被加分的词和基础排名靠前的词打分，词表再大开销也只和这部分有关。
+        """
+        if not self.terms:
+            return Selection(None, "")
+        now = time.time()
+        in_title = {t.word for t in self.find(window_title)} if window_title else set()
+        with _usage_lock:
+            used = [self.terms[w] for w in _usage if w in self.terms]
+        candidates = {t.word: t for t in self._ranked[:max(self._hotwords, self._prompt_chars // 2)]}
+        for t in self._by_profile.get(profile, ()):
+            candidates[t.word] = t
+        for t in used:
+            candidates[t.word] = t
+        for w in in_title:
+            candidates[w] = self.terms[w]
+
+        def score(t):
+            return (t.weight + 2.0 * (profile in t.profiles) + 3.0 * (t.word in in_title)
+                    + self._usage_boost(t.word, now))
+
+        ranked = sorted(candidates.values(), key=lambda t: (-score(t), t.order))
+        words, size = [], 0
+        for t in ranked:
+            if size + len(t.word) > self._prompt_chars:
+                break
+            words.append(t.word)
+            size += len(t.word) + 1
+        hot = [t.word for t in ranked if len(t.word) <= HOTWORD_MAX_LEN][:self._hotwords]
+        return Selection("，".join(words) or None, ",".join(f"{w}|10" for w in hot))
+
+    def observe(self, text):
+        """记录识别结果里出现的词条，后续会话优先挑选"""
+        found = self.find(text)
+        if not found:
+            return
+        now = time.time()
+        with _usage_lock:
+            for t in found:
+                count, last = _usage.get(t.word, (0.0, now))
+                _usage[t.word] = (count * 0.5 ** ((now - last) / self._half_life) + 1, now)
+
+    # ── 拼音纠错 ──
+
+    def warm(self):
+        """后台预先构建拼音索引，首次纠错不必等待"""
+        if self._correct:
+            self._get_index()
+
+    def _get_index(self):
+        """{字数: (模糊拼音 → 词, {首音节: BK 树})}；只收 min_chars 字以上的纯汉字词条"""
+        with self._index_lock:
+            if self._index is not None:
+                return self._index or None
+            pinyin = _get_pinyin()
+            if pinyin is None:
+                self._index = {}
+                return None
+            t0 = time.perf_counter()
+            index = {}
+            for t in self._ranked:
+                if len(t.word) < self._min_chars or not _HAN.fullmatch(t.word):
+                    continue
+                key = tuple(_fuzzy(s) for s in pinyin(t.word))
+                exact, trees = index.setdefault(len(t.word), ({}, {}))
+                exact.setdefault(key, t.word)
+                trees.setdefault(key[0], _BKTree()).add(key, t.word)
+            self._index = index
+            log.info(f"[词典] 拼音索引 {sum(len(e) for e, _ in index.values())} 条 "
+                     f"({(time.perf_counter() - t0) * 1000:.0f}ms)")
+            return index or None
+
+    def _tolerance(self, n):
+        """允许的拼音字母编辑距离：模糊音之外，3 字词只认同音，4 字以上每 2 字容 1 个字母"""
+        return 0 if n <= 3 else n // 2 - 1
+
+    def correct(self, text):
+        """把与词条拼音相同/相近的汉字片段换成词条，返回 (新文本, [(原片段, 词条)])
+
+        从左到右、同一位置先试长词；首音节必须模糊相同，只在对应的小 BK 树里查编辑距离。
+        """
+        if not self._correct or not text:
+            return text, []
+        index = self._get_index()
+        if not index:
+            return text, []
+        pinyin = _get_pinyin()
+        lengths = sorted(index, reverse=True)
+        out, fixes, pos = [], [], 0
+        for m in _HAN.finditer(text):
+            run = m.group()
+            if len(run) < lengths[-1]:
+                continue
+            syllables = [_fuzzy(s) for s in pinyin(run)]
+            out.append(text[pos:m.start()])
+            i = 0
+            while i < len(run):
+                for n in lengths:
+                    if i + n > len(run):
+                        continue
+                    exact, trees = index[n]
+                    key = tuple(syllables[i:i + n])
+                    word = exact.get(key)
+                    if word is None and self._tolerance(n) and syllables[i] in trees:
+                        hit = trees[syllables[i]].search(key, self._tolerance(n))
+                        word = hit and hit[1]
+                    if word:
+                        if word != run[i:i + n]:
+                            fixes.append((run[i:i + n], word))
+                        out.append(word)
+                        i += n
+                        break
+                else:
+                    out.append(run[i])
+                    i += 1
+            pos = m.end()
+        if not fixes:
+            return text, []
+        out.append(text[pos:])
+        return "".join(out), fixes
+
+
+def _read_file(path, start):
+    """每行一个词，可用 tab 跟上逗号分隔的 profile 名；# 开头为注释"""
+    terms = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            word, _, profiles = line.partition("\t")
+            if not word.strip():
+                continue
+            profiles = frozenset(p.strip() for p in profiles.split(",") if p.strip())
+            terms.append(Term(word.strip(), 1.0, profiles, start + len(terms)))
+    return terms
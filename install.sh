@@ -13,7 +13,7 @@ echo "[1/3] 创建虚拟环境..."
 python3 -m venv .venv
 
 echo "[2/3] 安装依赖..."
-.venv/bin/pip install -q sounddevice numpy pynput pyperclip pyautogui httpx pystray Pillow pyyaml opencc-python-reimplemented
+.venv/bin/pip install -q sounddevice numpy pynput pyperclip pyautogui httpx pystray Pillow pyyaml opencc-python-reimplemented websockets
 
 echo "[3/3] 初始化配置..."
 if [ ! -f config.yaml ]; then
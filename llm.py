@@ -1,24 +1,22 @@
+import atexit
+import collections
+import hashlib
+import json
 import logging
+import os
 import re
+import tempfile
+import threading
+import time
 log = logging.getLogger("voice")
 import httpx
 
-_client = None
-
+import cancel
+import metrics
 
-def _pick_profile(cfg, window_title=""):
-    llm = cfg.get("llm", {})
-    profiles = llm.get("profiles", {})
-    default = llm.get("default_profile", "general")
-    if window_title:
-        for rule in llm.get("auto_match", []):
-            if re.search(rule["pattern"], window_title, re.IGNORECASE):
-                name = rule["profile"]
-                if name in profiles:
-                    return name, profiles[name]["prompt"]
-    if default in profiles:
-        return default, profiles[default]["prompt"]
-    return "general", llm.get("prompt", "")
+_client = None
+_cache = None
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.json")
 
 
 def _headers(cfg):
@@ -30,6 +28,189 @@ def _strip_think(text):
     return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
 
 
+class _ThinkFilter:
+    """流式过滤 <think>...</think>，标签可能跨 chunk"""
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self._buf = ""
+        self._inside = False
+
+    def feed(self, s):
+        self._buf += s
+        out = []
+        while self._buf:
+            tag = self.CLOSE if self._inside else self.OPEN
+            i = self._buf.find(tag)
+            if i >= 0:
+                if not self._inside:
+                    out.append(self._buf[:i])
+                self._buf = self._buf[i + len(tag):]
+                self._inside = not self._inside
+                continue
+            # 末尾可能是标签的前半截，先留着
+            keep = next((k for k in range(len(tag) - 1, 0, -1) if self._buf.endswith(tag[:k])), 0)
+            if not self._inside:
+                out.append(self._buf[:len(self._buf) - keep])
+            self._buf = self._buf[len(self._buf) - keep:]
+            break
+        return "".join(out)
+
+    def flush(self):
+        rest, self._buf = ("" if self._inside else self._buf), ""
+        return rest
+
+
+_SENTENCE_END = "。！？!?；;\n"
+
+
+class _SentenceCommitter:
+    """按句子边界把文本提交给 on_text，首尾空白不输出"""
+
+    def __init__(self, on_text):
+        self._on_text = on_text
+        self._buf = ""
+        self.committed = ""
+        self.first_at = None
+
+    def _commit(self, piece):
+        if not self.committed:
+            piece = piece.lstrip()
+        if piece:
+            if self.first_at is None:
+                self.first_at = time.perf_counter()
+            self.committed += piece
+            self._on_text(piece)
+
+    def feed(self, s):
+        self._buf += s
+        i = max(self._buf.rfind(c) for c in _SENTENCE_END)
+        if i < 0:
+            return
+        piece, self._buf = self._buf[:i + 1], self._buf[i + 1:]
+        stripped = piece.rstrip()
+        self._buf = piece[len(stripped):] + self._buf
+        self._commit(stripped)
+
+    def finish(self):
+        self._commit(self._buf.rstrip())
+        self._buf = ""
+        return self.committed
+
+
+def _hash(s):
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()[:16]
+
+
+class _PolishCache:
+    """润色结果的 LRU 缓存，按 (model, prompt, text) 作键，持久化到 llm_cache.json
+
+    加载时丢弃 prompt 已不在当前配置里的条目，修改 profile 后旧结果自动失效。
+    put 只改内存，SAVE_DELAY_SEC 内的多次写入合并成一次后台写盘，退出时补写。
+    """
+    SAVE_DELAY_SEC = 2.0
+
+    def __init__(self, path, size, prompts):
+        self._path = path
+        self._size = size
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 串行写盘，不阻塞 get
+        self._timer = None
+        self._entries = collections.OrderedDict()
+        self.hits = self.misses = 0
+        valid = {_hash(p) for p in prompts}
+        try:
+            with open(path, encoding="utf-8") as f:
+                for key, prompt_hash, result in json.load(f):
+                    if prompt_hash in valid:
+                        self._entries[key] = (prompt_hash, result)
+        except (OSError, ValueError):
+            pass
+        while len(self._entries) > size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def key(model, prompt, text):
+        return _hash(f"{model}\0{prompt}\0{text}")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, prompt, result):
+        with self._lock:
+            self._entries[key] = (_hash(prompt), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+            if self._timer is None:
+                self._timer = threading.Timer(self.SAVE_DELAY_SEC, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """有未落盘的写入就立即写盘（后台定时器和退出时调用）"""
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+        try:
+            self._save()
+        except Exception as e:
+            log.info(f"[LLM] 缓存写入失败: {e}")
+
+    def _save(self):
+        """写到同目录的独立临时文件再 os.replace；写盘串行，最后落盘的总是最新快照"""
+        with self._save_lock:
+            with self._lock:
+                data = [[k, ph, r] for k, (ph, r) in self._entries.items()]
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self._path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, self._path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+
+
+def _flush_cache():
+    if _cache is not None:
+        _cache.flush()
+
+
+atexit.register(_flush_cache)
+
+
+def _init_cache(llm):
+    global _cache
+    _flush_cache()  # 重建前先把旧缓存的写入落盘，新缓存从文件读到的才是最新的
+    if not llm.get("cache"):
+        _cache = None
+        return
+    prompts = [p.get("prompt", "") for p in llm.get("profiles", {}).values()] + [llm.get("prompt", "")]
+    _cache = _PolishCache(CACHE_PATH, llm.get("cache_size", 2000), prompts)
+    log.info(f"[LLM] 缓存 {len(_cache._entries)} 条")
+
+
+def reload(old, new):
+    """配置热更新：profile 或缓存设置变化时重建缓存，失效的条目随之丢弃"""
+    if _cache is not None or new.get("llm", {}).get("cache"):
+        if any(old.get("llm", {}).get(k) != new.get("llm", {}).get(k)
+               for k in ("profiles", "prompt", "cache", "cache_size")):
+            _init_cache(new.get("llm", {}))
+
+
 def preload(cfg):
     global _client
     llm = cfg.get("llm", {})
@@ -40,55 +221,175 @@ def preload(cfg):
         import sys
         sys.exit(1)
     _client = httpx.Client(timeout=60)
+    # 缓存文件可能较大，后台读取；读完前的请求只是不命中缓存
+    threading.Thread(target=_init_cache, args=(llm,), daemon=True).start()
     log.info(f"[LLM] {llm['model']}")
 
 
-def polish(text, cfg, selected_text=None, force_profile=None, window_title=""):
+def _resolve_prompt(cfg, selected_text, force_profile, window_title):
+    llm = cfg.get("llm", {})
+    if force_profile:
+        return force_profile, llm.get("profiles", {}).get(force_profile, {}).get("prompt", "")
+    if selected_text:
+        prompt_tpl = llm.get("profiles", {}).get("command", {}).get("prompt", "")
+        return "command", prompt_tpl.replace("{clipboard}", selected_text)
+    return cfg.profile_for(window_title)
+
+
+# ── 跳过判定：识别结果已经足够干净时不请求 LLM ──
+
+_REWRITE_PROFILES = ("command", "bash")  # 输出与原文是两回事，永远要请求
+_GATE_DEFAULTS = {"short_chars": 4, "max_chars": 20, "require_punct": True}
+_PLAIN = re.compile(r"[\W_]+")
+_REPEAT = re.compile(r"(.{1,3})\1{2,}")  # 同一片段连说三遍：口吃或识别重复
+_SELF_FIX = re.compile(r"嗯|呃|那个那个|就是说|不对|哦不|我是说|说错了|重说|重来")
+_LATIN = re.compile(r"[A-Za-z][A-Za-z0-9_.+#-]*")
+_END_PUNCT = "。！？…!?~～"
+
+
+def _gate_options(llm, profile_name):
+    """llm.skip 为全局默认，profiles.<name>.skip 可为 false（该 profile 总是请求）或覆盖部分阈值"""
+    opts = llm.get("skip") or {}
+    if not opts.get("enabled") or profile_name in _REWRITE_PROFILES:
+        return None
+    override = llm.get("profiles", {}).get(profile_name, {}).get("skip", True)
+    if override is False:
+        return None
+    return {**_GATE_DEFAULTS, **opts, **(override if isinstance(override, dict) else {})}
+
+
+def needs_llm(text, cfg, profile_name):
+    """本地判定这句话是否需要 LLM，返回 (是否需要, 原因)
+
+    短句（应答、确认）直接输出；中等长度的句子在标点完整、没有口误/语气词/重复、
+    英文词都在词典里时也跳过；其余交给 LLM。
+    """
+    opts = _gate_options(cfg.get("llm", {}), profile_name)
+    if opts is None:
+        return True, "profile"
+    plain = _PLAIN.sub("", text)
+    if len(plain) <= opts["short_chars"]:
+        return False, "短句"
+    if len(plain) > opts["max_chars"]:
+        return True, "长句"
+    if _REPEAT.search(plain):
+        return True, "重复"
+    if _SELF_FIX.search(text):
+        return True, "口误/语气词"
+    known = {t.word.lower() for t in cfg.dictionary.find(text)}
+    if any(w.lower() not in known for w in _LATIN.findall(text)):
+        return True, "英文"
+    if opts["require_punct"] and text.rstrip()[-1] not in _END_PUNCT:
+        return True, "缺标点"
+    return False, "干净"
+
+
+def _body(llm, prompt, text):
+    return {
+        "model": llm["model"],
+        "messages": [{"role": "user", "content": prompt + text}],
+        "temperature": 0,
+    }
+
+
+def _complete(cfg, prompt, text):
+    resp = cancel.call(_client.post, cfg["llm"]["api_url"], headers=_headers(cfg),
+                       json=_body(cfg["llm"], prompt, text), timeout=60, cleanup=lambda r: r.close())
+    resp.raise_for_status()
+    return _strip_think(resp.json()["choices"][0]["message"]["content"])
+
+
+def _complete_stream(cfg, prompt, text, committer):
+    """SSE 流式请求，边收边过滤 <think>，按句子提交"""
+    think = _ThinkFilter()
+    body = dict(_body(cfg["llm"], prompt, text), stream=True)
+    request = _client.build_request("POST", cfg["llm"]["api_url"], headers=_headers(cfg), json=body, timeout=60)
+    resp = cancel.call(_client.send, request, stream=True, cleanup=lambda r: r.close())
+    try:
+        resp.raise_for_status()
+        done = False
+        for line in resp.iter_lines():
+            cancel.check()  # 取消时直接断开连接，不再读剩下的流
+            # [DONE] 之后继续读完响应体，连接才能放回连接池复用
+            if done or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                done = True
+                continue
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                committer.feed(think.feed(delta))
+    finally:
+        resp.close()
+    committer.feed(think.flush())
+    return committer.finish()
+
+
+def polish(text, cfg, selected_text=None, force_profile=None, window_title="", on_text=None):
+    """on_text 不为空且开启 llm.stream 时，按句子边界增量回调已确认的文本，返回值为完整文本"""
     global _client
     llm = cfg.get("llm", {})
     if not llm.get("enabled"):
         return text
 
-    if force_profile:
-        profile_name = force_profile
-        prompt = llm.get("profiles", {}).get(force_profile, {}).get("prompt", "")
-    elif selected_text:
-        profile_name = "command"
-        prompt_tpl = llm.get("profiles", {}).get("command", {}).get("prompt", "")
-        prompt = prompt_tpl.replace("{clipboard}", selected_text)
-    else:
-        profile_name, prompt = _pick_profile(cfg, window_title)
+    profile_name, prompt = _resolve_prompt(cfg, selected_text, force_profile, window_title)
+    if not selected_text:
+        t0 = time.perf_counter()
+        needed, reason = needs_llm(text, cfg, profile_name)
+        metrics.record("llm_gate", time.perf_counter() - t0, profile=profile_name, skip=not needed, reason=reason)
+        if not needed:
+            log.info(f"[LLM] 跳过 {profile_name}（{reason}）{text}")
+            return text
+        log.info(f"[LLM] 需要 {profile_name}（{reason}）")
+    # 语音指令的 prompt 里带着选中文本，不缓存
+    cache_key = _PolishCache.key(llm["model"], prompt, text) if _cache and not selected_text else None
+    if cache_key:
+        t0 = time.perf_counter()
+        result = _cache.get(cache_key)
+        if result is not None:
+            metrics.record("llm_cache_hit", time.perf_counter() - t0, profile=profile_name)
+            log.info(f"[LLM] 缓存命中 {profile_name} ({(time.perf_counter() - t0) * 1e6:.0f}µs) "
+                     f"hit={_cache.hits} miss={_cache.misses} {result}")
+            return result
+    committer = _SentenceCommitter(on_text) if on_text and llm.get("stream") else None
 
     try:
         if _client is None:
             _client = httpx.Client(timeout=60)
-        import time
         log.info(f"[LLM] 请求 {llm['model']}|{profile_name}...")
         t0 = time.perf_counter()
         for attempt in range(2):
             try:
-                resp = _client.post(
-                    llm["api_url"],
-                    headers=_headers(cfg),
-                    json={
-                        "model": llm["model"],
-                        "messages": [{"role": "user", "content": prompt + text}],
-                        "temperature": 0,
-                    },
-                    timeout=60,
-                )
-                resp.raise_for_status()
+                if committer:
+                    result = _complete_stream(cfg, prompt, text, committer)
+                else:
+                    result = _complete(cfg, prompt, text)
                 break
             except (httpx.ConnectError, httpx.TimeoutException) as e:
-                if attempt == 0:
+                if attempt == 0 and not (committer and committer.committed):
                     log.info(f"[LLM] 连接失败，重试: {e}")
                     _client = httpx.Client(timeout=60)
+                    if committer:
+                        committer = _SentenceCommitter(on_text)
                     continue
                 raise
         elapsed = time.perf_counter() - t0
-        result = _strip_think(resp.json()["choices"][0]["message"]["content"])
+        metrics.record("llm", elapsed, profile=profile_name, model=llm["model"])
+        if committer and committer.first_at:
+            metrics.record("llm_first_sentence", committer.first_at - t0, profile=profile_name)
+            log.info(f"[LLM] 首句 {committer.first_at - t0:.2f}s")
         log.info(f"[LLM] {llm['model']}|{profile_name} ({elapsed:.2f}s) {result}")
+        if cache_key:
+            _cache.put(cache_key, prompt, result)
+            log.info(f"[LLM] 缓存 hit={_cache.hits} miss={_cache.misses}")
         return result
+    except cancel.Cancelled:
+        raise
     except Exception as e:
         log.info(f"[LLM] 失败: {e}")
+        # 已经输出的部分无法撤回，只能以它为准
+        if committer and committer.committed:
+            return committer.committed
         return text
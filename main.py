@@ -1,26 +1,25 @@
-import queue
-import threading
 import logging
 import signal
 import sys
 import os
 import platform
 import subprocess
-import yaml
-import time
-import pystray
-import pyperclip
-import pyautogui
+import metrics
+import config
 from pynput import keyboard
-from PIL import Image, ImageDraw
+from audio import Segment
 from recorder import Recorder
-from stt import transcribe, preload
-from llm import polish, preload as preload_llm
-from output import type_text
+from stt import transcribe, transcribe_stream, start_stream, preload, prewarm, model_state, reload as reload_stt
+from llm import polish, preload as preload_llm, reload as reload_llm
+from output import type_text, copy_selection
+from pipeline import Processor
+from window import WindowTracker
 
 IS_MAC = platform.system() == "Darwin"
 IS_WIN = platform.system() == "Windows"
 
+# 托盘（pystray/PIL）在键盘监听启动之后才导入，模型在后台加载，见 main()
+
 
 def setup_logging():
     log_fmt = "%(asctime)s %(message)s"
@@ -33,11 +32,7 @@ def setup_logging():
 
 setup_logging()
 log = logging.getLogger("voice")
-
-def load_config():
-    cfg_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
-    with open(cfg_path, encoding="utf-8") as f:
-        return yaml.safe_load(f)
+metrics.mark("import")
 
 SPECIAL_KEYS = {
     "ctrl_r": keyboard.Key.ctrl_r,
@@ -46,6 +41,7 @@ SPECIAL_KEYS = {
     "alt_l": keyboard.Key.alt_l,
     "shift_r": keyboard.Key.shift_r,
     "shift_l": keyboard.Key.shift_l,
+    "esc": keyboard.Key.esc,
 }
 if IS_MAC:
     SPECIAL_KEYS.update({
@@ -53,160 +49,82 @@ if IS_MAC:
         "cmd_l": keyboard.Key.cmd_l,
     })
 
-CFG = load_config()
+CFG = config.load()
+metrics.configure(CFG)
 recording = False
 tray_icon = None
-task_queue = queue.Queue()
 
-# 当前录音会话的上下文（按下热键时确定，整个会话共享）
-_current_selected = None
-_current_is_terminal = False
+# 当前录音会话的模式（按下热键时确定）
 _current_mode = None
-_current_window_title = ""
-_segment_count = 0
-_session_id = 0
-_session_results = {}
-_session_total = {}
-_session_lock = threading.Lock()
-
-
-def _on_segment(wav):
-    """录音中静音切割回调"""
-    global _segment_count
-    _segment_count += 1
-    with _session_lock:
-        if _session_id not in _session_results:
-            _session_results[_session_id] = []
-    log.info(f"[自动切割] 第{_segment_count}段 {len(wav)} bytes")
-    selected = _current_selected if _segment_count == 1 else None
-    task_queue.put((_session_id, wav, selected, _current_is_terminal, _current_mode, _current_window_title))
-
-
-rec = Recorder(on_segment=_on_segment)
 
 
 if IS_MAC:
     TERMINAL_PROCESSES = ("terminal", "iterm2", "alacritty", "wezterm-gui", "kitty", "hyper")
-else:
+elif IS_WIN:
     TERMINAL_PROCESSES = ("windowsterminal.exe", "powershell.exe", "cmd.exe", "pwsh.exe",
                           "conhost.exe", "cmder.exe", "mintty.exe", "alacritty.exe", "wezterm-gui.exe")
+else:
+    TERMINAL_PROCESSES = ("gnome-terminal-", "gnome-terminal-server", "konsole", "xterm", "alacritty",
+                          "kitty", "wezterm-gui", "foot", "tilix", "terminator", "xfce4-terminal")
 
-
-def _get_foreground_window():
-    """获取当前前台窗口的进程名和标题"""
-    if IS_MAC:
-        try:
-            script = '''
-            tell application "System Events"
-                set fp to first application process whose frontmost is true
-                set pname to name of fp
-            end tell
-            tell application pname to get name of front window
-            '''
-            title = subprocess.check_output(["osascript", "-e", script],
-                                            stderr=subprocess.DEVNULL, timeout=2).decode().strip()
-            script2 = '''
-            tell application "System Events"
-                set fp to first application process whose frontmost is true
-                return name of fp
-            end tell
-            '''
-            proc = subprocess.check_output(["osascript", "-e", script2],
-                                           stderr=subprocess.DEVNULL, timeout=2).decode().strip().lower()
-            return proc, title
-        except Exception:
-            return "", ""
-    else:
-        try:
-            import ctypes
-            from ctypes import wintypes
-            hwnd = ctypes.windll.user32.GetForegroundWindow()
-            pid = wintypes.DWORD()
-            ctypes.windll.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
-            handle = ctypes.windll.kernel32.OpenProcess(0x0400 | 0x0010, False, pid.value)
-            buf = ctypes.create_unicode_buffer(260)
-            ctypes.windll.psapi.GetModuleFileNameExW(handle, None, buf, 260)
-            ctypes.windll.kernel32.CloseHandle(handle)
-            proc_name = os.path.basename(buf.value).lower()
-            length = ctypes.windll.user32.GetWindowTextLengthW(hwnd)
-            tbuf = ctypes.create_unicode_buffer(length + 1)
-            ctypes.windll.user32.GetWindowTextW(hwnd, tbuf, length + 1)
-            return proc_name, tbuf.value
-        except Exception:
-            return "", ""
+windows = WindowTracker()
 
 
 def _is_terminal(proc_name):
     return proc_name in TERMINAL_PROCESSES
 
 
+def _send_copy():
+    kb = keyboard.Controller()
+    mod = keyboard.Key.cmd if IS_MAC else keyboard.Key.ctrl_l
+    kb.press(mod)
+    kb.press('c')
+    kb.release('c')
+    kb.release(mod)
+
+
 def _try_copy_selection(proc_name):
     """尝试复制选中文本，返回选中的文本或 None"""
     if _is_terminal(proc_name):
         return None
-    if IS_MAC:
-        old = pyperclip.paste()
-        kb = keyboard.Controller()
-        kb.press(keyboard.Key.cmd)
-        kb.press('c')
-        kb.release('c')
-        kb.release(keyboard.Key.cmd)
-        time.sleep(0.15)
-        new = pyperclip.paste()
-        if new != old:
-            return new.strip() or None
-        return None
-    else:
-        import ctypes
-        old_seq = ctypes.windll.user32.GetClipboardSequenceNumber()
-        kb = keyboard.Controller()
-        kb.press(keyboard.Key.ctrl_l)
-        kb.press('c')
-        kb.release('c')
-        kb.release(keyboard.Key.ctrl_l)
-        time.sleep(0.15)
-        new_seq = ctypes.windll.user32.GetClipboardSequenceNumber()
-        if new_seq != old_seq:
-            return pyperclip.paste().strip() or None
-        return None
+    return copy_selection(_send_copy)
+
+
+def _transcribe_job(job):
+    if not recording:
+        update_icon("processing")
+    if isinstance(job.audio, Segment):
+        return transcribe(job.audio, CFG, context=job.session.context(job.seq), window_title=job.window_title)
+    return transcribe_stream(job.audio)
 
 
-def worker():
-    while True:
-        item = task_queue.get()
-        if item is None:
-            break
-        sid, wav, selected, is_terminal, mode, window_title = item
-        try:
-            if not recording:
-                update_icon("processing")
-            text = transcribe(wav, CFG)
-            if text:
-                if mode == "bash":
-                    text = polish(text, CFG, force_profile="bash")
-                elif selected:
-                    text = polish(text, CFG, selected_text=selected)
-                else:
-                    text = polish(text, CFG, window_title=window_title)
-            with _session_lock:
-                if sid in _session_results:
-                    _session_results[sid].append(text or "")
-                    total = _session_total.get(sid)
-                    if total and len(_session_results[sid]) >= total:
-                        full_text = "".join(_session_results[sid])
-                        del _session_results[sid], _session_total[sid]
-                    else:
-                        full_text = None
-                else:
-                    full_text = text
-            if full_text:
-                type_text(full_text, is_terminal=is_terminal)
-        except Exception as e:
-            log.info(f"[错误] {e}")
-        finally:
-            if not recording:
-                update_icon("idle")
-        task_queue.task_done()
+def _polish_job(job, on_text):
+    if job.mode == "bash":
+        return polish(job.text, CFG, force_profile="bash", on_text=on_text)
+    if job.selected:
+        return polish(job.text, CFG, selected_text=job.selected, on_text=on_text)
+    return polish(job.text, CFG, window_title=job.window_title, on_text=on_text)
+
+
+def _emit(sid, is_terminal, text):
+    try:
+        if text:
+            type_text(text, is_terminal=is_terminal)
+    except Exception as e:
+        log.info(f"[错误] {e}")
+    finally:
+        if not recording and not processor.pending():
+            update_icon("idle")
+
+
+_pipe_cfg = CFG.get("pipeline", {})
+processor = Processor(_transcribe_job, _polish_job, _emit,
+                      stt_workers=_pipe_cfg.get("stt_workers", 1), llm_workers=_pipe_cfg.get("llm_workers", 2),
+                      incremental=CFG.get("llm", {}).get("stream", False),
+                      max_pending=_pipe_cfg.get("max_pending", 3), overflow=_pipe_cfg.get("overflow", "drop"),
+                      polish_mode=_pipe_cfg.get("polish", "segment"), speculative=_pipe_cfg.get("speculative", False))
+rec = Recorder(on_segment=processor.on_segment, cfg=CFG)
+metrics.mark("recorder")
 
 
 def parse_hotkey(s):
@@ -218,9 +136,25 @@ def parse_hotkey(s):
 
 HOTKEY = parse_hotkey(CFG.get("hotkey", "ctrl_r"))
 BASH_HOTKEY = parse_hotkey(CFG.get("command_hotkey", "alt_r"))
+CANCEL_HOTKEY = parse_hotkey(CFG.get("cancel_hotkey", "esc"))
+
+
+def on_config_change(old, new):
+    """config.yaml 被修改：整体替换 CFG，各模块只重建真正变化的部分"""
+    global CFG, HOTKEY, BASH_HOTKEY, CANCEL_HOTKEY
+    CFG = new
+    reload_stt(old, new)
+    reload_llm(old, new)
+    HOTKEY = parse_hotkey(new.get("hotkey", "ctrl_r"))
+    BASH_HOTKEY = parse_hotkey(new.get("command_hotkey", "alt_r"))
+    CANCEL_HOTKEY = parse_hotkey(new.get("cancel_hotkey", "esc"))
+    for section in ("vad", "recorder", "pipeline"):
+        if config.changed(old, new, section):
+            log.info(f"[配置] {section} 的修改需要重启后生效")
 
 
 def make_icon(state="idle"):
+    from PIL import Image, ImageDraw
     size = 64
     img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
     d = ImageDraw.Draw(img)
@@ -242,8 +176,22 @@ def update_icon(state="idle"):
         tray_icon.icon = make_icon(state)
 
 
+def cancel_sessions():
+    """取消键：丢弃正在录的音频，中止所有还没输出的会话（包括进行中的 STT/LLM 请求）"""
+    global recording
+    if recording:
+        recording = False
+        rec.stop()
+    n = processor.cancel_all("用户取消")
+    log.info(f"[取消] 已取消 {n} 个会话")
+    update_icon("idle")
+
+
 def on_press(key):
-    global recording, _current_selected, _current_is_terminal, _current_mode, _current_window_title, _segment_count, _session_id
+    global recording, _current_mode
+    if key == CANCEL_HOTKEY and (recording or processor.pending()):
+        cancel_sessions()
+        return
     if recording:
         return
     if key == HOTKEY:
@@ -252,22 +200,21 @@ def on_press(key):
         _current_mode = "bash"
     else:
         return
-    proc_name, title = _get_foreground_window()
-    _current_is_terminal = _is_terminal(proc_name)
-    _current_window_title = title
-    _segment_count = 0
-    _session_id += 1
-    log.info(f"[on_press] sid={_session_id} {proc_name} | {title}")
+    prewarm(CFG)
+    proc_name, title, age = windows.get_fresh()
+    is_terminal = _is_terminal(proc_name)
+    selected = None
     if _current_mode == "input":
-        _current_selected = _try_copy_selection(proc_name)
-        if _current_selected:
-            log.info(f"[选中文本] {_current_selected[:50]}...")
-    else:
-        _current_selected = None
+        selected = _try_copy_selection(proc_name)
+        if selected:
+            log.info(f"[选中文本] {selected[:50]}...")
     recording = True
+    streamer = start_stream(CFG, title)
+    sid = processor.begin(is_terminal, _current_mode, title, selected, streamer)
+    log.info(f"[on_press] sid={sid} {proc_name} | {title} ({age:.2f}s ago)")
     log.info(f"[录音开始] mode={_current_mode}")
     update_icon("recording")
-    rec.start()
+    rec.start(on_audio=streamer.feed if streamer else None)
 
 
 def on_release(key):
@@ -278,27 +225,10 @@ def on_release(key):
        (_current_mode == "bash" and key == BASH_HOTKEY):
         recording = False
         update_icon("idle")
-        wav = rec.stop()
-        log.info(f"[on_release] sid={_session_id} wav={len(wav)} segments={_segment_count}")
-        if len(wav) < 38400 and _segment_count == 0:
-            log.info(f"[on_release] 丢弃，太短")
-            return
-        total = _segment_count + (1 if len(wav) >= 38400 else 0)
-        selected = _current_selected if _segment_count == 0 else None
-        if len(wav) >= 38400:
-            task_queue.put((_session_id, wav, selected, _current_is_terminal, _current_mode, _current_window_title))
-        if _segment_count > 0:
-            with _session_lock:
-                _session_total[_session_id] = total
-                results = _session_results.get(_session_id)
-                if results is not None and len(results) >= total:
-                    full_text = "".join(results)
-                    del _session_results[_session_id], _session_total[_session_id]
-                else:
-                    full_text = None
-            if full_text:
-                type_text(full_text, is_terminal=_current_is_terminal)
-        qsize = task_queue.qsize()
+        segment = rec.stop()
+        log.info(f"[on_release] sid={processor.sid} audio={segment.duration:.1f}s segments={processor.segments}")
+        processor.end(segment)
+        qsize = processor.qsize()
         if qsize > 1:
             log.info(f"[队列] {qsize} 条待处理")
 
@@ -315,8 +245,13 @@ def open_config(icon, _):
 def open_log(icon, _):
     _open_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice.log"))
 
+def _stats_menu():
+    import pystray
+    return [pystray.MenuItem(line, None, enabled=False) for line in metrics.lines()]
+
+
 def quit_app(icon, _):
-    task_queue.put(None)
+    processor.stop()
     icon.stop()
 
 
@@ -324,24 +259,32 @@ def main():
     global tray_icon
     hotkey = CFG.get("hotkey", "ctrl_r")
     log.info(f"热键: {hotkey} | STT: {CFG['stt']['engine']}")
-    preload(CFG)
+    preload(CFG, on_ready=lambda: metrics.mark("stt_ready"))
     preload_llm(CFG)
-
-    threading.Thread(target=worker, daemon=True).start()
+    config.Watcher(CFG, on_config_change)
 
     listener = keyboard.Listener(on_press=on_press, on_release=on_release, daemon=True)
     listener.start()
+    metrics.mark("listener")  # 从这里起已经可以按键录音
 
+    import pystray
     tray_icon = pystray.Icon("voice", make_icon(), "语音输入", menu=pystray.Menu(
+        pystray.MenuItem(lambda _: f"模型: {model_state()}", None, enabled=False),
         pystray.MenuItem("配置", open_config),
         pystray.MenuItem("日志", open_log),
+        pystray.MenuItem("统计", pystray.Menu(_stats_menu)),
         pystray.MenuItem("退出", quit_app),
     ))
     log.info("语音输入已启动")
     if IS_MAC:
         log.info("Mac 用户请确保已授权「辅助功能」权限（系统设置 → 隐私与安全性 → 辅助功能）")
     signal.signal(signal.SIGINT, lambda *_: quit_app(tray_icon, None))
-    tray_icon.run()
+
+    def on_tray_ready(icon):
+        icon.visible = True
+        metrics.mark("tray")
+
+    tray_icon.run(setup=on_tray_ready)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+import collections
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("voice")
+
+METRICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.jsonl")
+WINDOW = 500  # 每个阶段保留最近多少个样本
+
+_lock = threading.Lock()
+_samples = collections.defaultdict(lambda: collections.deque(maxlen=WINDOW))
+_totals = collections.defaultdict(lambda: [0, 0.0])  # stage -> [count, sum]，累计值给 Prometheus
+_file = None
+_local = threading.local()
+_boot = time.perf_counter()  # main 最先导入本模块，近似进程启动时刻
+_marks = []
+
+
+def configure(cfg):
+    """metrics.enabled 打开 JSON-lines 输出，metrics.port 打开本地 Prometheus 文本接口"""
+    global _file
+    opts = (cfg or {}).get("metrics") or {}
+    if opts.get("enabled") and _file is None:
+        _file = open(opts.get("path", METRICS_PATH), "a", encoding="utf-8")
+    if opts.get("port"):
+        serve(opts["port"])
+
+
+@contextlib.contextmanager
+def tag(**tags):
+    """给当前线程接下来的 span 打上 sid/seq 等标签"""
+    old = getattr(_local, "tags", {})
+    _local.tags = {**old, **tags}
+    try:
+        yield
+    finally:
+        _local.tags = old
+
+
+def record(stage, seconds, **fields):
+    fields = {**getattr(_local, "tags", {}), **fields}
+    with _lock:
+        _samples[stage].append(seconds)
+        total = _totals[stage]
+        total[0] += 1
+        total[1] += seconds
+        if _file:
+            _file.write(json.dumps({"ts": round(time.time(), 3), "stage": stage, "sec": round(seconds, 4), **fields},
+                                   ensure_ascii=False) + "\n")
+            _file.flush()
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0, **fields)
+
+
+def mark(phase):
+    """启动分析：记录从启动到 phase 完成的时间，日志里带上距上一个 mark 的增量"""
+    now = time.perf_counter() - _boot
+    with _lock:
+        prev = _marks[-1][1] if _marks else 0.0
+        _marks.append((phase, now))
+    record(f"startup.{phase}", now)
+    log.info(f"[启动] {phase} {now * 1000:.0f}ms (+{(now - prev) * 1000:.0f}ms)")
+
+
+def startup():
+    """[(phase, 距启动秒数)]，按完成顺序"""
+    with _lock:
+        return list(_marks)
+
+
+def _quantile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary():
+    """stage -> {n, p50, p95, p99, mean}，基于最近 WINDOW 个样本"""
+    with _lock:
+        data = {k: sorted(v) for k, v in _samples.items() if v}
+    return {k: {"n": len(v), "p50": _quantile(v, 0.5), "p95": _quantile(v, 0.95), "p99": _quantile(v, 0.99),
+                "mean": sum(v) / len(v)} for k, v in sorted(data.items())}
+
+
+def lines():
+    """托盘菜单里显示的文本；启动各阶段合成一行放在最后"""
+    out = [f"{k}: p50 {s['p50'] * 1000:.0f}ms  p95 {s['p95'] * 1000:.0f}ms  (n={s['n']})"
+           for k, s in summary().items() if not k.startswith("startup.")] or ["暂无数据"]
+    marks = startup()
+    if marks:
+        out.append("启动: " + " → ".join(f"{phase} {t * 1000:.0f}ms" for phase, t in marks))
+    return out
+
+
+def prometheus():
+    out = ["# TYPE voice_stage_seconds summary"]
+    stats = summary()
+    with _lock:
+        totals = {k: tuple(v) for k, v in _totals.items()}
+    for stage, s in stats.items():
+        for q in ("0.5", "0.95", "0.99"):
+            key = {"0.5": "p50", "0.95": "p95", "0.99": "p99"}[q]
+            out.append(f'voice_stage_seconds{{stage="{stage}",quantile="{q}"}} {s[key]:.6f}')
+        count, total = totals.get(stage, (0, 0.0))
+        out.append(f'voice_stage_seconds_count{{stage="{stage}"}} {count}')
+        out.append(f'voice_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+    return "\n".join(out) + "\n"
+
+
+_server = None
+
+
+def serve(port):
+    global _server
+    if _server is not None:
+        return
+    # http.server 只在打开统计端口时才导入，不拖慢启动
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_):
+            pass
+
+        def do_GET(self):
+            body = prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        _server = ThreadingHTTPServer(("127.0.0.1", int(port)), _Handler)
+    except OSError as e:
+        log.info(f"[统计] 端口 {port} 启动失败: {e}")
+        return
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    log.info(f"[统计] http://127.0.0.1:{port}/metrics")
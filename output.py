@@ -1,20 +1,165 @@
-import time
 import platform
+import threading
+import time
 import pyperclip
-import pyautogui
+
+import metrics
 
 IS_MAC = platform.system() == "Darwin"
+IS_WIN = platform.system() == "Windows"
+
+COPY_TIMEOUT_SEC = 0.15  # 发出复制快捷键后最多等多久；在按键回调里同步执行，没有选区时会等满，不能再长
+RESTORE_DELAY_SEC = 0.5  # 粘贴后多久在后台恢复剪贴板
+PASTE_SETTLE_SEC = 0.05  # 连续粘贴的最小间隔：目标程序读走上一段之前不能改写剪贴板
+POLL_SEC = 0.005
+
+
+class Clipboard:
+    """剪贴板后端：sequence() 返回变化计数，wait_change 在变化后立即返回
+
+    默认实现按内容轮询，平台有变化计数时子类覆盖 sequence()。
+    """
+
+    def paste(self):
+        return pyperclip.paste()
+
+    def copy(self, text):
+        pyperclip.copy(text)
+
+    def sequence(self):
+        return hash(self.paste())
+
+    def wait_change(self, old_seq, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.sequence() != old_seq:
+                return True
+            time.sleep(POLL_SEC)
+        return self.sequence() != old_seq
+
+
+class WindowsClipboard(Clipboard):
+    def sequence(self):
+        import ctypes
+        return ctypes.windll.user32.GetClipboardSequenceNumber()
+
+
+class MacClipboard(Clipboard):
+    """NSPasteboard.changeCount（需 pyobjc），没有时退回按内容轮询"""
+
+    def __init__(self):
+        try:
+            from AppKit import NSPasteboard
+            self._pb = NSPasteboard.generalPasteboard()
+        except ImportError:
+            self._pb = None
+
+    def sequence(self):
+        if self._pb is None:
+            return super().sequence()
+        return self._pb.changeCount()
+
+
+class LinuxClipboard(Clipboard):
+    """X11/Wayland 没有通用的变化计数，按内容快速轮询（pyperclip 调用 xclip/xsel/wl-paste）"""
+
 
+class FakeClipboard(Clipboard):
+    """测试用的内存剪贴板；app_delay 模拟目标程序响应复制快捷键的耗时"""
 
-def type_text(text: str, is_terminal=False):
-    """通过剪贴板+粘贴输出文本到当前光标位置，完成后恢复剪贴板"""
-    old = pyperclip.paste()
-    pyperclip.copy(text)
+    def __init__(self, text="", app_delay=0.0):
+        self._text = text
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.app_delay = app_delay
+        self.selection = None
+
+    def paste(self):
+        return self._text
+
+    def copy(self, text):
+        with self._lock:
+            self._text = text
+            self._seq += 1
+
+    def sequence(self):
+        return self._seq
+
+    def send_copy(self):
+        """模拟目标程序收到复制快捷键：app_delay 秒后把 selection 写入剪贴板"""
+        if self.selection is not None:
+            threading.Timer(self.app_delay, self.copy, args=(self.selection,)).start()
+
+
+def default_clipboard():
+    if IS_WIN:
+        return WindowsClipboard()
+    if IS_MAC:
+        return MacClipboard()
+    return LinuxClipboard()
+
+
+clipboard = default_clipboard()
+_restore_lock = threading.Lock()
+_restore = None  # (timer, 原剪贴板内容, 粘贴时的 sequence)
+_last_paste = 0.0
+
+
+def copy_selection(send_copy, timeout=COPY_TIMEOUT_SEC):
+    """发送复制快捷键，剪贴板一变化立即返回选中文本；超时未变化返回 None"""
+    seq = clipboard.sequence()
+    send_copy()
+    if clipboard.wait_change(seq, timeout):
+        return clipboard.paste().strip() or None
+    return None
+
+
+def _restore_clipboard(old, seq):
+    global _restore
+    with _restore_lock:
+        if _restore is None or _restore[2] != seq:
+            return  # 已被新的粘贴接管
+        _restore = None
+        # 期间用户自己复制了别的内容就不覆盖
+        if clipboard.sequence() == seq:
+            clipboard.copy(old)
+
+
+def _send_paste(is_terminal):
+    import pyautogui
     if IS_MAC:
         pyautogui.hotkey("command", "v")
-    else:
+    elif IS_WIN:
         pyautogui.hotkey("shift", "insert")
-    time.sleep(0.1)
+    elif is_terminal:
+        pyautogui.hotkey("ctrl", "shift", "v")
+    else:
+        pyautogui.hotkey("ctrl", "v")
     if is_terminal:
         pyautogui.press("right")
-    pyperclip.copy(old)
+
+
+def type_text(text: str, is_terminal=False, send_paste=_send_paste):
+    """通过剪贴板+粘贴输出文本到当前光标位置，稍后在后台恢复剪贴板
+
+    连续粘贴时沿用第一次保存的原内容，只恢复一次。
+    """
+    global _restore, _last_paste
+    with _restore_lock, metrics.span("paste"):
+        if _restore:
+            _restore[0].cancel()
+            old = _restore[1]
+        else:
+            old = clipboard.paste()
+        # 只有紧接着上一次粘贴时才等，单次粘贴不增加延迟
+        wait = _last_paste + PASTE_SETTLE_SEC - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        clipboard.copy(text)
+        seq = clipboard.sequence()
+        send_paste(is_terminal)
+        _last_paste = time.monotonic()
+        timer = threading.Timer(RESTORE_DELAY_SEC, _restore_clipboard, args=(old, seq))
+        timer.daemon = True
+        _restore = (timer, old, seq)
+        timer.start()
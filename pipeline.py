@@ -0,0 +1,505 @@
+import collections
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+import cancel
+import metrics
+
+log = logging.getLogger("voice")
+
+
+@dataclass
+class Session:
+    """一次按键录音：窗口上下文 + 取消令牌，会话内所有 Job 共享"""
+    sid: int
+    is_terminal: bool = False
+    mode: str = "input"
+    window_title: str = ""
+    selected: str = None
+    streamer: object = None
+    segments: int = 0
+    ended: bool = False
+    released: float = None
+    token: cancel.Token = field(default_factory=cancel.Token)
+    jobs: list = field(default_factory=list)  # 已入队的 Job，合并积压会话时用
+    stt_texts: dict = field(default_factory=dict)  # seq -> 识别结果（润色前）
+    total: int = None  # 松开热键后确定的总段数
+    polish_queued: bool = False  # 会话级润色已发起
+    spec_text: str = None  # 推测润色用的前缀文本
+    spec_token: cancel.Token = None
+    spec_result: str = None
+    spec_adopted: bool = False  # 最终文本与推测前缀相同，推测结果到达即输出
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def context(self, seq):
+        """seq 之前各段已识别的文本，给后面的段做识别上下文"""
+        return "".join(self.stt_texts[k] for k in sorted(self.stt_texts) if k < seq)
+
+    def prefix(self):
+        """从第 1 段起连续已识别的文本"""
+        texts = []
+        for seq in itertools.count(1):
+            if seq not in self.stt_texts:
+                return "".join(texts)
+            texts.append(self.stt_texts[seq])
+
+    def mergeable_into(self, other):
+        """能否把本会话的音频并到 other 后面一起处理"""
+        return (self.ended and other.ended and self.streamer is None and other.streamer is None
+                and not other.polish_queued
+                and self.selected is None and all(not j.started for j in self.jobs)
+                and (self.mode, self.window_title, self.is_terminal)
+                == (other.mode, other.window_title, other.is_terminal))
+
+
+@dataclass
+class Job:
+    """一个待处理的音频段（一次会话可切成多段，seq 从 1 开始）"""
+    sid: int
+    seq: int
+    audio: object  # audio.Segment 或 stt.LocalStreamer
+    selected: str = None
+    is_terminal: bool = False
+    mode: str = "input"
+    window_title: str = ""
+    text: str = ""
+    created: float = field(default_factory=time.perf_counter)
+    queued: float = field(default_factory=time.perf_counter)  # 进入当前阶段队列的时间
+    session: Session = None
+    started: bool = False
+    token: cancel.Token = None  # 推测润色用会话令牌的子令牌，过期即取消
+
+
+class Stage:
+    """处理阶段：独立队列 + N 个 worker 线程，put(None) 停止"""
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self._fn = fn
+        self._queue = queue.Queue()
+        self._workers = max(1, int(workers))
+        for i in range(self._workers):
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True).start()
+
+    def put(self, job):
+        self._queue.put(job)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def stop(self):
+        for _ in range(self._workers):
+            self._queue.put(None)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._fn(job)
+            except Exception as e:
+                log.info(f"[{self.name}] 错误: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class SessionAssembler:
+    """按 (sid, seq) 重组各段结果，按会话顺序输出
+
+    默认整段会话完成后一次输出；incremental=True 时队首会话按段顺序尽早输出，
+    包括 add_partial 提交的流式片段。
+    """
+
+    def __init__(self, emit, incremental=False):
+        self._emit = emit
+        self._incremental = incremental
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._order = collections.deque()
+        self._parts = {}
+        self._partial = {}
+        self._total = {}
+        self._ctx = {}
+        self._next_seq = 1
+        self._emitted = 0
+
+    def open(self, sid, ctx=None):
+        with self._lock:
+            self._order.append(sid)
+            self._parts[sid] = {}
+            self._ctx[sid] = ctx
+
+    def add(self, sid, seq, text):
+        with self._lock:
+            if sid in self._parts:
+                self._parts[sid][seq] = text or ""
+        self._flush()
+
+    def add_partial(self, sid, seq, piece):
+        """流式片段：必须是该段最终文本的前缀部分"""
+        if not self._incremental:
+            return
+        with self._lock:
+            if sid in self._parts:
+                self._partial.setdefault((sid, seq), []).append(piece)
+        self._flush()
+
+    def close(self, sid, total):
+        """录音结束，确定会话总段数"""
+        with self._lock:
+            if sid in self._parts:
+                self._total[sid] = total
+        self._flush()
+
+    def extend(self, sid, extra):
+        """已关闭的会话追加 extra 段（合并积压会话），会话已输出则返回 False"""
+        with self._lock:
+            if sid not in self._total:
+                return False
+            self._total[sid] += extra
+            return True
+
+    def drop(self, sid):
+        """会话被取消：丢弃已收到的结果，后面的会话照常输出"""
+        with self._lock:
+            if sid not in self._parts:
+                return
+            if self._order[0] == sid:
+                self._next_seq, self._emitted = 1, 0
+            self._order.remove(sid)
+            del self._parts[sid], self._ctx[sid]
+            self._total.pop(sid, None)
+            for key in [k for k in self._partial if k[0] == sid]:
+                del self._partial[key]
+        self._flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._order)
+
+    def has(self, sid):
+        with self._lock:
+            return sid in self._parts
+
+    def _ready(self, sid):
+        total = self._total.get(sid)
+        return total is not None and len(self._parts[sid]) >= total
+
+    def _take_incremental(self, ready):
+        """队首会话：按段顺序取出可输出的文本，已输出的部分不再重复"""
+        while self._order:
+            sid = self._order[0]
+            parts = self._parts[sid]
+            seq = self._next_seq
+            if seq in parts:
+                ready.append((sid, self._ctx[sid], parts[seq][self._emitted:]))
+                self._partial.pop((sid, seq), None)
+                self._next_seq, self._emitted = seq + 1, 0
+                continue
+            pieces = self._partial.pop((sid, seq), None)
+            if pieces:
+                text = "".join(pieces)
+                self._emitted += len(text)
+                ready.append((sid, self._ctx[sid], text))
+            if not self._ready(sid):
+                return
+            self._order.popleft()
+            if not any(r[0] == sid for r in ready):
+                # 空会话或之前已输出完的会话：补一次空输出，调用方靠它收尾（和整段模式一致）
+                ready.append((sid, self._ctx[sid], ""))
+            del self._parts[sid], self._total[sid], self._ctx[sid]
+            self._next_seq, self._emitted = 1, 0
+
+    def _flush(self):
+        with self._emit_lock:
+            ready = []
+            with self._lock:
+                if self._incremental:
+                    self._take_incremental(ready)
+                while self._order and self._ready(self._order[0]):
+                    sid = self._order.popleft()
+                    parts = self._parts.pop(sid)
+                    del self._total[sid]
+                    text = "".join(parts[k] for k in sorted(parts))
+                    ready.append((sid, self._ctx.pop(sid), text))
+            for sid, ctx, text in ready:
+                self._emit(sid, ctx, text)
+
+
+class Processor:
+    """录音会话 + STT → LLM → 输出流水线，main 和基准测试共用
+
+    transcribe(job) -> 文本；polish(job, on_text) -> 文本；emit(sid, is_terminal, 文本)。
+    未输出的会话超过 max_pending 时按 overflow 处理积压：drop 取消最早的会话，
+    merge 先把上下文相同、还没开始识别的会话并成一个，仍超出再取消。
+    polish="session" 时各段识别完后整段会话只润色一次；speculative=True 时录音中
+    先润色已识别的前缀，松开后文本没变（如最后一段是静音）就直接用推测结果。
+    """
+
+    def __init__(self, transcribe, polish, emit, stt_workers=1, llm_workers=2, incremental=False,
+                 min_sec=1.2, max_pending=3, overflow="drop", polish_mode="segment", speculative=False):
+        self._transcribe = transcribe
+        self._polish = polish
+        self._emit_fn = emit
+        self._per_session = polish_mode == "session"
+        self._speculative = speculative and self._per_session
+        self._min_sec = min_sec
+        self._max_pending = max_pending
+        self._overflow = overflow
+        self._lock = threading.Lock()
+        self.sessions = collections.OrderedDict()  # sid -> 未输出完的 Session
+        self.current = Session(0)
+        self.assembler = SessionAssembler(self._emit, incremental)
+        self.stt = Stage("STT", self._stt_job, stt_workers)
+        self.llm = Stage("LLM", self._llm_job, llm_workers)
+
+    @property
+    def sid(self):
+        return self.current.sid
+
+    @property
+    def segments(self):
+        return self.current.segments
+
+    def begin(self, is_terminal=False, mode="input", window_title="", selected=None, streamer=None):
+        """按下热键：开始新会话，返回 sid"""
+        session = Session(self.current.sid + 1, is_terminal, mode, window_title, selected, streamer)
+        if streamer:
+            session.token.on_cancel(lambda _: streamer.cancel())
+        with self._lock:
+            self.sessions[session.sid] = session
+            self.current = session
+        self.assembler.open(session.sid, session)
+        return session.sid
+
+    def _submit(self, session, seq, audio):
+        job = Job(session.sid, seq, audio, session.selected if seq == 1 else None,
+                  session.is_terminal, session.mode, session.window_title, session=session)
+        with self._lock:
+            session.jobs.append(job)
+        self.stt.put(job)
+
+    def on_segment(self, segment):
+        """录音中静音切割回调（音频回调线程，只做入队）"""
+        session = self.current
+        if session.cancelled:
+            return
+        session.segments += 1
+        log.info(f"[自动切割] 第{session.segments}段 {segment.duration:.1f}s speech={segment.has_speech}")
+        self._submit(session, session.segments, segment)
+
+    def end(self, segment):
+        """松开热键：提交最后一段，返回本次会话的总段数，0 表示太短被丢弃"""
+        session = self.current
+        if session.cancelled:
+            return 0
+        session.released = time.perf_counter()
+        session.ended = True
+        if segment.duration < self._min_sec and session.segments == 0:
+            log.info(f"[on_release] 丢弃，太短")
+            if session.streamer:
+                session.streamer.cancel()
+            self.assembler.close(session.sid, 0)
+            return 0
+        if session.streamer:
+            self._submit(session, 1, session.streamer)
+            total = 1
+        else:
+            if segment.duration >= self._min_sec:
+                session.segments += 1
+                self._submit(session, session.segments, segment)
+            total = session.segments
+        with self._lock:
+            session.total = total
+        # 会话级润色只输出一段
+        self.assembler.close(session.sid, min(total, 1) if self._per_session else total)
+        if self._per_session:
+            self._after_stt(session)
+        self._relieve()
+        return total
+
+    def cancel(self, sid, reason):
+        with self._lock:
+            session = self.sessions.pop(sid, None)
+        if session is None:
+            return
+        session.token.cancel(reason)
+        self.assembler.drop(sid)
+        log.info(f"[取消] sid={sid} {reason}")
+
+    def cancel_all(self, reason):
+        """取消录音中的和所有还没输出的会话，返回取消的个数"""
+        with self._lock:
+            sids = list(self.sessions)
+        for sid in sids:
+            self.cancel(sid, reason)
+        return len(sids)
+
+    def _relieve(self):
+        """积压超过 max_pending 时合并/丢弃最早的会话"""
+        if self._overflow == "merge":
+            self._merge()
+        with self._lock:
+            stale = list(self.sessions)[:max(0, len(self.sessions) - self._max_pending)]
+        for sid in stale:
+            self.cancel(sid, f"积压超过 {self._max_pending} 个会话，丢弃")
+
+    def _merge(self):
+        merged = []
+        with self._lock:
+            if len(self.sessions) <= self._max_pending:
+                return
+            sessions = list(self.sessions.values())
+            target = sessions[0]
+            for session in sessions[1:]:
+                extra = 0 if self._per_session else len(session.jobs)
+                if not (session.mergeable_into(target) and self.assembler.extend(target.sid, extra)):
+                    target = session
+                    continue
+                # 还没开始识别的段改挂到前一个会话末尾，原会话不再输出
+                total = target.segments
+                for job in session.jobs:
+                    total += 1
+                    job.sid, job.seq, job.session = target.sid, total, target
+                target.jobs.extend(session.jobs)
+                target.segments = target.total = total
+                session.jobs = []
+                del self.sessions[session.sid]
+                merged.append(session.sid)
+                log.info(f"[积压] sid={session.sid} 并入 sid={target.sid}，共 {total} 段")
+        for sid in merged:
+            self.assembler.drop(sid)
+
+    def pending(self):
+        return self.assembler.pending()
+
+    def qsize(self):
+        return self.stt.qsize() + self.llm.qsize()
+
+    def stop(self):
+        self.stt.stop()
+        self.llm.stop()
+
+    def _emit(self, sid, session, text):
+        if session.cancelled:
+            return
+        if not self.assembler.has(sid):
+            with self._lock:
+                self.sessions.pop(sid, None)
+        released, session.released = session.released, None
+        with metrics.tag(sid=sid):
+            if released is not None:
+                metrics.record("release_to_output", time.perf_counter() - released)
+            self._emit_fn(sid, session.is_terminal, text)
+
+    def _start(self, job):
+        """worker 取到任务：会话已取消则跳过"""
+        with self._lock:
+            job.started = True
+            return not job.session.cancelled
+
+    def _stt_job(self, job):
+        """STT 阶段：有文本则交给 LLM 阶段，否则直接交给重组"""
+        if not self._start(job):
+            return
+        text = ""
+        with metrics.tag(sid=job.sid, seq=job.seq), cancel.bind(job.session.token):
+            metrics.record("stt_queue", time.perf_counter() - job.queued)
+            try:
+                text = self._transcribe(job)
+            except cancel.Cancelled:
+                return
+            except Exception as e:
+                log.info(f"[错误] {e}")
+        job.audio = None
+        job.session.stt_texts[job.seq] = text
+        if self._per_session:
+            self._after_stt(job.session)
+        elif text:
+            job.text = text
+            job.queued = time.perf_counter()
+            self.llm.put(job)
+        else:
+            self.assembler.add(job.sid, job.seq, "")
+
+    def _after_stt(self, session):
+        """会话级润色：各段都识别完后合成一次请求；还在录音时按需对已识别的前缀发起推测润色"""
+        with self._lock:
+            if session.cancelled or session.polish_queued:
+                return
+            if session.total is not None and len(session.stt_texts) >= session.total:
+                session.polish_queued = True
+                text = session.prefix()
+                reuse = bool(text) and text == session.spec_text
+                result = session.spec_result if reuse else None
+                if reuse and result is None:
+                    session.spec_adopted = True  # 推测请求还在进行，完成后由它输出
+                if not reuse and session.spec_token is not None:
+                    session.spec_token.cancel("推测已过期")
+                job = None
+            elif self._speculative and session.total is None:
+                text = session.prefix()
+                if not text or text == session.spec_text:
+                    return
+                if session.spec_token is not None:
+                    session.spec_token.cancel("推测已过期")
+                session.spec_text, session.spec_result = text, None
+                session.spec_token = cancel.Token(session.token)
+                job = self._session_job(session, 0, text)
+                job.token = session.spec_token
+            else:
+                return
+        if job is not None:
+            log.info(f"[LLM] 推测润色 sid={session.sid} 前 {len(session.stt_texts)} 段")
+            self.llm.put(job)
+            return
+        if self._speculative:
+            metrics.record("llm_speculative", 0.0, sid=session.sid, hit=reuse)
+        if reuse:
+            log.info(f"[LLM] 推测润色命中 sid={session.sid}" + ("" if result is not None else "，等待结果"))
+            if result is not None:
+                self.assembler.add(session.sid, 1, result)
+        elif text:
+            log.info(f"[LLM] 会话润色 sid={session.sid} 共 {len(session.stt_texts)} 段")
+            self.llm.put(self._session_job(session, 1, text))
+        else:
+            self.assembler.add(session.sid, 1, "")
+
+    def _session_job(self, session, seq, text):
+        """整段会话的润色任务；seq=0 为推测润色，不直接输出"""
+        return Job(session.sid, seq, None, session.selected, session.is_terminal, session.mode,
+                   session.window_title, text=text, session=session)
+
+    def _llm_job(self, job):
+        token = job.token or job.session.token
+        if token.cancelled:
+            return
+        text = job.text
+        speculative = job.token is not None
+        # 推测结果不一定会用上，不做增量输出
+        on_text = None if speculative else lambda piece: self.assembler.add_partial(job.sid, job.seq, piece)
+        with metrics.tag(sid=job.sid, seq=job.seq), cancel.bind(token):
+            metrics.record("llm_queue", time.perf_counter() - job.queued)
+            try:
+                text = self._polish(job, on_text)
+            except cancel.Cancelled:
+                return
+            except Exception as e:
+                log.info(f"[错误] {e}")
+        if speculative:
+            with self._lock:
+                if token.cancelled:
+                    return
+                job.session.spec_result = text
+                if not job.session.spec_adopted:
+                    return
+            job.seq = 1
+        self.assembler.add(job.sid, job.seq, text)
@@ -1,84 +1,181 @@
-import io
-import wave
-import collections
+import tempfile
 import threading
+import weakref
 import numpy as np
-import sounddevice as sd
+import vad
+from audio import SAMPLE_RATE, Segment
 
-SAMPLE_RATE = 16000
 PRE_BUFFER_SEC = 0.5
 BLOCK_SIZE = 1024
+RAM_BUFFER_SEC = 120
+SPILL_BUFFER_SEC = 1800
 
-MIN_DURATION_SEC = 6
-SILENCE_THRESHOLD = 0.01
-SILENCE_DURATION_SEC = 0.8
 
+class CaptureBuffer:
+    """预分配的录音缓冲：回调只做切片赋值，片段以视图返回，不再拷贝
 
-def _to_wav(audio_data):
-    buf = io.BytesIO()
-    with wave.open(buf, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes((audio_data * 32767).astype(np.int16).tobytes())
-    return buf.getvalue()
+    待机时写入预缓冲环，开始录音时把预缓冲拷到线性缓冲开头。写到末尾时，如果交出去的视图
+    都已释放（STT 处理完了），把未取走的部分挪回开头继续用；否则未取走的部分转存到临时文件的
+    内存映射，内存占用有上限。上一轮的视图还在被使用时（STT 排队中），新一轮另开缓冲，避免被覆盖。
+    """
+
+    def __init__(self, preroll, ram_samples, spill_samples):
+        self._pre = np.zeros(preroll, dtype=np.float32)
+        self._pre_pos = 0
+        self._pre_full = False
+        self._ram_samples = ram_samples
+        self._spill_samples = spill_samples
+        self._lock = threading.Lock()
+        self._set_buf(np.zeros(ram_samples, dtype=np.float32))
+        self._w = 0
+        self._start = 0
+
+    def write_idle(self, data):
+        n = min(len(data), len(self._pre))
+        data = data[len(data) - n:]
+        end = self._pre_pos + n
+        if end <= len(self._pre):
+            self._pre[self._pre_pos:end] = data
+        else:
+            k = len(self._pre) - self._pre_pos
+            self._pre[self._pre_pos:] = data[:k]
+            self._pre[:n - k] = data[k:]
+            self._pre_full = True
+        self._pre_pos = end % len(self._pre)
+        self._pre_full = self._pre_full or end == len(self._pre)
+
+    def _set_buf(self, buf):
+        self._buf = buf
+        self._live = [0]  # 这块缓冲交出去还没释放的视图数；换缓冲后旧视图的释放不影响新计数
+
+    def _view(self, lo, hi):
+        """交出 [lo, hi) 的视图并计数；它和从它切出的视图都释放后计数减一
+
+        视图建在 memoryview 上，切片的 .base 停在这个视图而不是整块缓冲，释放时机才准确。
+        """
+        view = np.frombuffer(memoryview(self._buf[lo:hi]), dtype=np.float32)
+        live = self._live
+        with self._lock:
+            live[0] += 1
+        weakref.finalize(view, self._release, live)
+        return view
+
+    def _release(self, live):
+        with self._lock:
+            live[0] -= 1
+
+    def _in_use(self):
+        with self._lock:
+            return self._live[0] > 0
+
+    def start(self):
+        """开始录音，返回预缓冲的样本数"""
+        if self._in_use() or len(self._buf) != self._ram_samples:
+            self._set_buf(np.zeros(self._ram_samples, dtype=np.float32))
+        if self._pre_full:
+            k = len(self._pre) - self._pre_pos
+            self._buf[:k] = self._pre[self._pre_pos:]
+            self._buf[k:len(self._pre)] = self._pre[:self._pre_pos]
+            n = len(self._pre)
+        else:
+            n = self._pre_pos
+            self._buf[:n] = self._pre[:n]
+        self._pre_pos, self._pre_full = 0, False
+        self._w, self._start = n, 0
+        return n
+
+    def _spill(self, need):
+        """未取走的部分转存到新的内存映射；已取走的视图仍引用旧缓冲"""
+        pending = self._w - self._start
+        size = max(self._spill_samples, pending + need)
+        buf = np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode="w+", shape=(size,))
+        buf[:pending] = self._buf[self._start:self._w]
+        self._set_buf(buf)
+        self._w, self._start = pending, 0
+
+    def write(self, data, view=False):
+        """写入一块；view=True 时返回这块在缓冲中的视图（登记为存活，只有流式转写要留着用）"""
+        n = len(data)
+        if self._w + n > len(self._buf):
+            pending = self._w - self._start
+            if pending + n <= len(self._buf) // 2 and not self._in_use():
+                # 取走的片段都处理完了：未取走的尾巴挪回开头，长时间按住也留在内存里
+                self._buf[:pending] = self._buf[self._start:self._w]
+                self._w, self._start = pending, 0
+            else:
+                self._spill(n)
+        self._buf[self._w:self._w + n] = data
+        self._w += n
+        if view:
+            return self._view(self._w - n, self._w)
+        return None
+
+    def peek(self):
+        """上次 take 以来的音频（视图），不移动位置"""
+        return self._view(self._start, self._w)
+
+    def take(self):
+        """取走上次 take 以来的音频（视图）"""
+        view = self._view(self._start, self._w)
+        self._start = self._w
+        return view
 
 
 class Recorder:
-    def __init__(self, on_segment=None):
+    """on_segment(Segment)：录音中静音切割出的片段；stop() 返回最后一段"""
+
+    def __init__(self, on_segment=None, cfg=None, stream_factory=None):
         self._recording = False
-        self._chunks = []
         self._on_segment = on_segment
-        self._silence_frames = 0
-        self._total_frames = 0
-        self._silence_limit = int(SILENCE_DURATION_SEC * SAMPLE_RATE / BLOCK_SIZE)
-        self._min_frames = int(MIN_DURATION_SEC * SAMPLE_RATE / BLOCK_SIZE)
-
-        max_pre_frames = int(SAMPLE_RATE * PRE_BUFFER_SEC / BLOCK_SIZE) + 1
-        self._ring = collections.deque(maxlen=max_pre_frames)
-        self._stream = sd.InputStream(
+        self._on_audio = None
+        self._cutter = vad.Cutter.from_config(cfg)
+        opts = (cfg or {}).get("recorder") or {}
+        self._buf = CaptureBuffer(
+            int(SAMPLE_RATE * PRE_BUFFER_SEC),
+            int(SAMPLE_RATE * opts.get("ram_sec", RAM_BUFFER_SEC)),
+            int(SAMPLE_RATE * opts.get("spill_sec", SPILL_BUFFER_SEC)))
+        if stream_factory is None:
+            import sounddevice as sd
+            stream_factory = sd.InputStream
+        self._stream = stream_factory(
             samplerate=SAMPLE_RATE, channels=1, dtype="float32",
             blocksize=BLOCK_SIZE, callback=self._callback,
         )
         self._stream.start()
 
     def _callback(self, data, frames, time_info, status):
-        chunk = data.copy()
+        data = data[:, 0]
         if self._recording:
-            self._chunks.append(chunk)
-            self._total_frames += 1
-            rms = np.sqrt(np.mean(chunk ** 2))
-            if rms < SILENCE_THRESHOLD:
-                self._silence_frames += 1
-            else:
-                self._silence_frames = 0
-            if (self._total_frames > self._min_frames and
-                    self._silence_frames >= self._silence_limit and
-                    self._on_segment):
-                # 把 chunks 取走，WAV 编码放到别的线程避免阻塞音频回调
-                chunks = self._chunks
-                self._chunks = []
-                self._total_frames = 0
-                self._silence_frames = 0
-                threading.Thread(target=self._emit_segment, args=(chunks,), daemon=True).start()
+            # 回调里不分配：VAD 直接看 data，只有流式转写才要一块会被留用的视图
+            chunk = self._buf.write(data, view=self._on_audio is not None)
+            cut = self._cutter.feed(data)
+            if self._on_audio:
+                # 流式模式：音频直接交给流式转写，不做静音切割
+                self._on_audio(chunk)
+                return
+            if cut and self._on_segment:
+                segment = self._take_segment()
+                self._cutter.reset()
+                self._on_segment(segment)
         else:
-            self._ring.append(chunk)
+            # 待机时也跑 VAD，让噪声底持续跟随环境
+            self._cutter.vad.process(data)
+            self._buf.write_idle(data)
 
-    def _emit_segment(self, chunks):
-        audio = np.concatenate(chunks)
-        wav = _to_wav(audio)
-        self._on_segment(wav)
+    def _take_segment(self):
+        return Segment(self._buf.take(), has_speech=self._cutter.has_speech())
 
-    def start(self):
-        self._chunks = list(self._ring)
-        self._ring.clear()
-        self._total_frames = len(self._chunks)
-        self._silence_frames = 0
+    def start(self, on_audio=None):
+        pre = self._buf.start()
+        self._on_audio = on_audio
+        self._cutter.reset()
+        self._cutter.samples = pre
+        if on_audio and pre:
+            # 流式模式不切割，预缓冲作为开头的音频交给流式转写
+            on_audio(self._buf.peek())
         self._recording = True
 
     def stop(self):
         self._recording = False
-        if not self._chunks:
-            return b""
-        audio = np.concatenate(self._chunks)
-        return _to_wav(audio)
+        self._on_audio = None
+        return self._take_segment()
@@ -1,19 +1,31 @@
 import base64
+import bisect
+import collections
+import concurrent.futures
 import hashlib
 import hmac
-import io
+import itertools
 import importlib.util
 import json
 import logging
 import os
+import queue
+import random
 import sys
+import threading
 import time
-import wave
+import urllib.parse
+import uuid
 from datetime import datetime, timezone
 
 import httpx
 import numpy as np
-import opencc
+
+import cancel
+import metrics
+import vad
+from audio import SAMPLE_RATE, Segment
+from config import changed
 
 log = logging.getLogger("voice")
 
@@ -32,11 +44,13 @@ def _setup_nvidia_dll_path():
                     os.environ["PATH"] = d + os.pathsep + os.environ.get("PATH", "")
 
 
-if sys.platform == "win32":
-    _setup_nvidia_dll_path()
-
 _model = None
-_t2s = opencc.OpenCC("t2s")
+_batched = None
+_scheduler = None
+_tc_client = None
+_tc_last_used = 0.0
+_t2s = None
+_t2s_lock = threading.Lock()
 _PUNCT_MAP = str.maketrans({
     ",": "，", ".": "。", "?": "？", "!": "！",
     ":": "：", ";": "；", "(": "（", ")": "）",
@@ -47,32 +61,133 @@ def _fix_punct(text):
     return text.translate(_PUNCT_MAP)
 
 
-def _is_silent(wav_bytes, threshold=0.01):
-    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
-        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32) / 32767
-        return np.sqrt(np.mean(audio ** 2)) < threshold
+def _is_silent(segment, cfg):
+    """优先用录音端 VAD 的结果，没有时在这里重新判定"""
+    if segment.has_speech is not None:
+        return not segment.has_speech
+    return not vad.has_speech(segment.pcm, cfg)
+
+
+# ── 模型生命周期：加载 → 预热 → 就绪 → 空闲卸载 ──
+
+_STATE_NAMES = {"unloaded": "未加载", "loading": "加载中", "warming": "预热中", "ready": "就绪"}
+_model_state = "unloaded"
+_model_gen = 0  # 卸载/配置变化时递增，作废进行中的加载
+_model_cond = threading.Condition()
+_model_last_used = 0.0
+_lifecycle_cfg = None
+
+
+def _load_model(cfg, gen):
+    global _model, _model_state
+    local = cfg["stt"]["local"]
+    device = local.get("device", "cuda")
+    name = local.get("model", "large-v3")
+    log.info(f"[STT] 加载 {name} (device={device})...")
+    t0 = time.perf_counter()
+    if sys.platform == "win32":
+        _setup_nvidia_dll_path()
+    from faster_whisper import WhisperModel
+    # 流式模式松开时要立即解码尾部，第二个 worker 让它不必排在被放弃的窗口解码后面
+    model = WhisperModel(name, device=device, compute_type="auto", num_workers=2 if local.get("streaming") else 1)
+    load_sec = time.perf_counter() - t0
+    with _model_cond:
+        if gen == _model_gen:
+            _model_state = "warming"
+    # 首次推理要初始化 kernel/缓存，用一秒静音先跑一遍
+    t1 = time.perf_counter()
+    segments, _ = model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language=local.get("language", "zh"))
+    list(segments)
+    warm_sec = time.perf_counter() - t1
+    metrics.record("model_load", load_sec, model=name)
+    metrics.record("model_warmup", warm_sec, model=name)
+    log.info(f"[STT] 就绪 ({name}, {device}) 加载 {load_sec:.2f}s 预热 {warm_sec:.2f}s")
+    with _model_cond:
+        if gen == _model_gen:
+            _model = model
+            _model_state = "ready"
+        _model_cond.notify_all()
+    return model
 
 
 def _get_model(cfg):
-    global _model
-    if _model is None:
-        local = cfg["stt"]["local"]
-        device = local.get("device", "cuda")
-        model = local.get("model", "large-v3")
-        log.info(f"[STT] 加载 {model} (device={device})...")
-        from faster_whisper import WhisperModel
-        _model = WhisperModel(model, device=device, compute_type="auto")
-        log.info(f"[STT] 就绪 ({model}, {device})")
-    return _model
+    """返回已加载的模型；正在加载时等待，未加载时在当前线程加载"""
+    global _model_state, _model_last_used
+    with _model_cond:
+        _model_last_used = time.monotonic()
+        if _model is not None:
+            return _model
+        load_now = _model_state == "unloaded"
+        if load_now:
+            _model_state = "loading"
+        gen = _model_gen
+    if load_now:
+        try:
+            return _load_model(cfg, gen)
+        except Exception:
+            with _model_cond:
+                if gen == _model_gen:
+                    _model_state = "unloaded"
+                _model_cond.notify_all()
+            raise
+    with _model_cond:
+        if _model is None and _model_state != "unloaded":
+            log.info(f"[STT] 模型{_STATE_NAMES[_model_state]}，本段音频排队等待")
+        while _model is None and _model_state != "unloaded":
+            _model_cond.wait()
+        if _model is None:
+            raise RuntimeError("模型加载失败")
+        return _model
+
+
+def _load_async(cfg, on_ready=None):
+    def run():
+        try:
+            _get_model(cfg)
+        except Exception as e:
+            log.info(f"[STT] 模型加载失败: {e}")
+            return
+        if on_ready:
+            on_ready()
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _unload_model(reason):
+    global _model, _batched, _model_state, _model_gen
+    with _model_cond:
+        had = _model is not None or _model_state != "unloaded"
+        _model = None
+        _batched = None
+        _model_state = "unloaded"
+        _model_gen += 1
+        _model_cond.notify_all()
+    if had:
+        log.info(f"[STT] 卸载模型（{reason}）")
+
 
+def _idle_watch():
+    while True:
+        time.sleep(10)
+        idle = (_lifecycle_cfg or {}).get("stt", {}).get("local", {}).get("idle_unload", 0)
+        if idle and _model is not None and time.monotonic() - _model_last_used > idle:
+            _unload_model(f"空闲 {idle}s")
 
-def _tc3_sign(secret_key, payload_str, timestamp):
+
+def model_state():
+    """托盘显示用"""
+    cfg = _lifecycle_cfg or {}
+    if cfg.get("stt", {}).get("engine") != "local":
+        return "云端"
+    return _STATE_NAMES[_model_state]
+
+
+def _tc3_sign(secret_key, payload_str, timestamp, host="asr.tencentcloudapi.com"):
     """腾讯云 TC3-HMAC-SHA256 签名"""
     service = "asr"
     date = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
     credential_scope = f"{date}/{service}/tc3_request"
     canonical = (f"POST\n/\n\ncontent-type:application/json; charset=utf-8\n"
-                 f"host:asr.tencentcloudapi.com\n\ncontent-type;host\n"
+                 f"host:{host}\n\ncontent-type;host\n"
                  f"{hashlib.sha256(payload_str.encode()).hexdigest()}")
     string_to_sign = (f"TC3-HMAC-SHA256\n{timestamp}\n{credential_scope}\n"
                       f"{hashlib.sha256(canonical.encode()).hexdigest()}")
@@ -87,59 +202,430 @@ def _tc3_sign(secret_key, payload_str, timestamp):
     return signature, credential_scope
 
 
+# ── 腾讯云连接池 ──
+
+TC_HOST = "asr.tencentcloudapi.com"
+
+
+def _tc_endpoint(tc, backup=False):
+    if backup:
+        return tc["backup_endpoint"]
+    return tc.get("endpoint", f"https://{TC_HOST}")
+
+
+def _get_tc_client(cfg):
+    """常驻连接池：keep-alive 复用 TCP/TLS 连接，装了 h2 时可开 HTTP/2"""
+    global _tc_client
+    if _tc_client is None:
+        tc = cfg["stt"].get("tencent", {})
+        http2 = bool(tc.get("http2")) and importlib.util.find_spec("h2") is not None
+        _tc_client = httpx.Client(
+            http2=http2, timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=tc.get("keepalive", 60)))
+    return _tc_client
+
+
+def _warm_tencent(cfg):
+    global _tc_last_used
+    t0 = time.perf_counter()
+    try:
+        # 任意请求即可建立连接，返回内容不关心
+        _get_tc_client(cfg).head(_tc_endpoint(cfg["stt"]["tencent"]), timeout=5)
+        _tc_last_used = time.monotonic()
+        log.info(f"[STT] 预热连接 ({time.perf_counter() - t0:.2f}s)")
+    except httpx.HTTPError as e:
+        log.info(f"[STT] 预热连接失败: {e}")
+
+
+def prewarm(cfg):
+    """按下热键时调用：本地模型已被空闲卸载则后台重新加载，与说话时间重叠；
+    腾讯云连接空闲较久则在后台刷新，松开时 socket 已就绪"""
+    engines = {cfg["stt"]["engine"], *(cfg["stt"].get("hedge", {}).get("engines") or [])}
+    if "local" in engines and _model_state == "unloaded":
+        log.info("[STT] 按下热键，后台重新加载模型")
+        _load_async(cfg)
+    if not engines & {"tencent", "tencent_backup"}:
+        return  # tencent_rt 在 start_stream 时建立连接
+    idle = cfg["stt"]["tencent"].get("warm_after", 5)
+    if time.monotonic() - _tc_last_used >= idle:
+        threading.Thread(target=_warm_tencent, args=(cfg,), daemon=True).start()
+
+
 # ── preload / unload ──
 
-def preload(cfg):
+def preload(cfg, on_ready=None):
+    """校验配置后立即返回；模型加载/连接预热在后台进行，完成后调用 on_ready()
+
+    加载完成前录下的音频在 STT 队列里等待模型就绪。
+    """
+    global _lifecycle_cfg
     engine = cfg["stt"]["engine"]
-    if engine == "local":
-        _get_model(cfg)
-    elif engine == "tencent":
+    _lifecycle_cfg = cfg
+    if engine in ("tencent", "tencent_rt"):
         tc = cfg["stt"].get("tencent", {})
         if not tc.get("secret_id") or not tc.get("secret_key"):
             log.error("[STT] 腾讯云 ASR 未配置 secret_id/secret_key，请编辑 config.yaml")
             sys.exit(1)
-    log.info(f"[STT] engine={engine}")
+        if engine == "tencent_rt" and not tc.get("appid"):
+            log.error("[STT] 腾讯云实时识别需要配置 appid，请编辑 config.yaml")
+            sys.exit(1)
+    threading.Thread(target=_idle_watch, daemon=True).start()
+    threading.Thread(target=_get_t2s, daemon=True).start()
+    threading.Thread(target=cfg.dictionary.warm, daemon=True).start()
+    hedge = cfg["stt"].get("hedge", {}).get("engines") or []
+    if engine == "local":
+        _load_async(cfg, on_ready)
+    else:
+        if "local" in hedge:
+            _load_async(cfg)  # 作为对冲备选，后台加载
+
+        def warm():
+            _warm_tencent(cfg)
+            if on_ready:
+                on_ready()
+        threading.Thread(target=warm, daemon=True).start()
+    log.info(f"[STT] engine={engine}" + (f" hedge={hedge}" if hedge else ""))
 
 
 def unload():
-    global _model
-    if _model is not None:
-        del _model
-        _model = None
+    global _tc_client
+    _unload_model("手动")
+    if _tc_client is not None:
+        _tc_client.close()
+        _tc_client = None
+
+
+def reload(old, new):
+    """配置热更新：只有引擎/模型/设备变化才重新加载模型，改词典不影响已加载的模型"""
+    global _tc_client, _lifecycle_cfg
+    _lifecycle_cfg = new
+    threading.Thread(target=new.dictionary.warm, daemon=True).start()  # 新配置的词典索引重新构建
+    if changed(old, new, "stt", "engine") or any(
+            changed(old, new, "stt", "local", k) for k in ("model", "device", "streaming")):
+        _unload_model("配置变化")
+        if "local" in (new["stt"]["engine"], *(new["stt"].get("hedge", {}).get("engines") or [])):
+            _load_async(new)
+        log.info(f"[STT] 引擎/模型变化，重新加载 engine={new['stt']['engine']}")
+    if changed(old, new, "stt", "tencent") and _tc_client is not None:
+        _tc_client.close()
+        _tc_client = None
+    if _scheduler is not None:
+        _scheduler.configure(new)
 
 
 # ── transcribe ──
 
-def transcribe_local(wav_bytes, cfg):
+def _terms(cfg, window_title=""):
+    """本次会话的词典子集：按窗口对应的 profile、标题里出现的词和近期用过的词挑选"""
+    return cfg.dictionary.select(cfg.profile_for(window_title)[0], window_title)
+
+
+def _prompt(cfg, context="", terms=None):
+    """词典 + 本会话前文末尾，作为 whisper 的 initial_prompt"""
+    words = terms.prompt if terms else cfg.local_prompt
+    tail = context[-cfg["stt"]["local"].get("context_chars", 100):] if context else ""
+    if words and tail:
+        return words + "，" + tail
+    return words or tail or None
+
+
+def _decode_options(segment, cfg, context="", terms=None):
+    """按片段选解码参数：短句贪心、长句 beam search；没开 trim 的长片段用 whisper 自带 VAD 跳过静音"""
+    local = cfg["stt"]["local"]
+    policy = local.get("decode", "adaptive")  # adaptive / greedy / beam
+    seconds = segment.duration
+    greedy = policy == "greedy" or (policy == "adaptive" and seconds < local.get("beam_above", 4.0))
+    vad_filter = local.get("vad_filter", "auto")
+    if vad_filter == "auto":
+        vad_filter = seconds >= local.get("vad_above", 20.0) and not (cfg.get("trim") or {}).get("enabled")
+    return {
+        "language": local.get("language", "zh"),
+        "initial_prompt": _prompt(cfg, context, terms),
+        "beam_size": 1 if greedy else local.get("beam_size", 5),
+        "vad_filter": bool(vad_filter),
+        # 单个 30 秒窗口内用不到时间戳，省掉时间戳 token
+        "without_timestamps": seconds <= 30,
+    }
+
+
+def transcribe_local(segment, cfg, context="", terms=None):
+    """context 为同一会话前几段已识别的文本，接在词典后面作为 prompt；terms 为本会话的词典子集"""
+    local = cfg["stt"]["local"]
+    if local.get("batch"):
+        # 多段拼成一次推理，只能共用 prompt 和解码参数，context/terms/_decode_options 不生效
+        return _get_scheduler(cfg).submit(segment.pcm)
     model = _get_model(cfg)
+    opts = _decode_options(segment, cfg, context, terms)
+    texts = []
+    with metrics.span("whisper_decode", beam=opts["beam_size"], vad=opts["vad_filter"], ctx=len(context)):
+        segments, _ = model.transcribe(segment.pcm, **opts)
+        for s in segments:  # 生成器逐段解码，被取消时在段之间停下
+            cancel.check()
+            texts.append(s.text)
+    return "".join(texts).strip()
+
+
+# ── 批量本地转写 ──
+
+_CLIP_SAMPLES = 30 * SAMPLE_RATE
+_GAP = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)
+
+
+def _transcribe_batch(audios, cfg):
+    """多个片段拼接后按 clip_timestamps 一次批量推理，再按时间归还给各片段
+
+    BatchedInferencePipeline 按采样点下标切 clip_timestamps（和它自己的 VAD 输出一致），
+    返回的 segment 时间则是秒。
+    """
+    global _batched
     local = cfg["stt"]["local"]
-    words = [w for w in local.get("dictionary", []) if w]
-    prompt = "，".join(words) if words else None
-    segments, _ = model.transcribe(
-        io.BytesIO(wav_bytes), language=local.get("language", "zh"), initial_prompt=prompt)
-    return "".join(s.text for s in segments).strip()
+    if _batched is None:
+        from faster_whisper import BatchedInferencePipeline
+        _batched = BatchedInferencePipeline(model=_get_model(cfg))
+    pieces, clips, starts = [], [], []
+    pos = 0
+    for audio in audios:
+        starts.append(pos)
+        for s in range(0, len(audio), _CLIP_SAMPLES):
+            e = min(s + _CLIP_SAMPLES, len(audio))
+            clips.append({"start": pos + s, "end": pos + e})
+        pieces += [audio, _GAP]
+        pos += len(audio) + len(_GAP)
+    segments, _ = _batched.transcribe(
+        np.concatenate(pieces), language=local.get("language", "zh"), initial_prompt=cfg.local_prompt,
+        clip_timestamps=clips, vad_filter=False, batch_size=len(clips))
+    texts = [[] for _ in audios]
+    for seg in segments:
+        mid = (seg.start + seg.end) / 2 * SAMPLE_RATE
+        texts[bisect.bisect_right(starts, mid) - 1].append(seg.text)
+    return ["".join(t).strip() for t in texts]
+
+
+class _BatchScheduler:
+    """收集 batch_window 秒内排队的片段，合并成一次批量推理，结果按片段归还"""
+
+    def __init__(self, cfg):
+        self.configure(cfg)
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+        log.info("[STT] 批量推理模式：一批共用整体词典 prompt，不带会话上下文、按窗口挑选的词条和按片段的解码参数")
+
+    def configure(self, cfg):
+        """换用新配置，从下一批开始生效"""
+        local = cfg["stt"]["local"]
+        self._cfg = cfg
+        self._window = local.get("batch_window", 0.05)
+        self._max = local.get("batch_size", 8)
+
+    def submit(self, audio):
+        """排队等批量推理的结果；会话取消时立即抛 Cancelled，还没开始推理的片段不再参与"""
+        fut = concurrent.futures.Future()
+        self._queue.put((audio, fut))
+        try:
+            return cancel.call(fut.result)
+        except cancel.Cancelled:
+            fut.cancel()
+            raise
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._window
+        while len(batch) < self._max:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(a, fut) for a, fut in self._collect() if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                texts = _transcribe_batch([a for a, _ in batch], self._cfg)
+                if len(batch) > 1:
+                    log.info(f"[STT] 批量推理 {len(batch)} 段")
+                for (_, fut), text in zip(batch, texts):
+                    fut.set_result(text)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+
+def _get_scheduler(cfg):
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = _BatchScheduler(cfg)
+    return _scheduler
+
+
+# ── 流式本地转写 ──
+
 
+class LocalStreamer:
+    """按住热键期间后台滑动窗口解码，连续两次一致的前缀即确认，松开后只解码未确认的尾部"""
 
-def transcribe_tencent(wav_bytes, cfg):
+    engine = "local_stream"
+
+    def __init__(self, cfg, terms=None):
+        local = cfg["stt"]["local"]
+        self._cfg = cfg
+        self._terms = terms
+        self._language = local.get("language", "zh")
+        self._interval = local.get("stream_interval", 1.0)
+        self._window = int(local.get("stream_window", 15) * SAMPLE_RATE)
+        self._lock = threading.Lock()
+        self._take_lock = threading.Lock()  # 松开时 finish 和后台解码可能同时取音频，VAD 不能并发喂
+        self._pending = []
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._committed = []
+        self._hypothesis = []
+        self._vad = vad.Cutter.from_config(cfg)
+        self._decoded_speech = 0  # 上次解码时累计的语音样本数
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, chunk):
+        """录音回调线程调用，只做 append"""
+        with self._lock:
+            self._pending.append(chunk.reshape(-1))
+
+    def _take_audio(self):
+        with self._take_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            # 静音判定放在解码线程，录音回调只做 append
+            for chunk in pending:
+                self._vad.feed(chunk)
+            with self._lock:
+                if pending:
+                    self._audio = np.concatenate([self._audio] + pending)
+                return self._audio
+
+    def _decode(self, audio, committed, abandon=False):
+        """abandon=True 时松开热键后在段之间放弃，返回 None"""
+        segments, _ = _get_model(self._cfg).transcribe(
+            audio, language=self._language, initial_prompt=_prompt(self._cfg, "".join(committed), self._terms),
+            word_timestamps=True, condition_on_previous_text=False)
+        words = []
+        for s in segments:
+            if abandon and self._stop.is_set():
+                return None
+            words.extend((w.word, w.end) for w in (s.words or []))
+        return words
+
+    def _step(self):
+        audio = self._take_audio()
+        if len(audio) < SAMPLE_RATE or self._vad.speech == self._decoded_speech:
+            return  # 上次解码以来没有新的语音（按住不说话、句间停顿），结果不会变
+        self._decoded_speech = self._vad.speech
+        words = self._decode(audio, self._committed, abandon=True)
+        with self._lock:
+            if words is None or self._stop.is_set():
+                return  # finish 已经接手尾部，这次结果作废
+            n = 0
+            while n < min(len(words), len(self._hypothesis)) and words[n][0] == self._hypothesis[n][0]:
+                n += 1
+            # 窗口过长仍未稳定时，强制确认除最后一个词之外的内容
+            if n == 0 and len(audio) > self._window and len(words) > 1:
+                n = len(words) - 1
+            if n:
+                # 确认前 n 个词，音频窗口推进到最后一个确认词的结尾
+                self._committed.extend(w for w, _ in words[:n])
+                self._audio = self._audio[int(words[n - 1][1] * SAMPLE_RATE):]
+            self._hypothesis = words[n:]
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self._step()
+            except Exception as e:
+                log.info(f"[STT] 流式解码失败: {e}")
+                return
+
+    def cancel(self):
+        self._stop.set()
+
+    def finish(self):
+        """停止后台解码并立即解码剩余尾部，返回完整文本
+
+        不等进行中的窗口解码：它的结果作废，已确认的部分以松开时为准。
+        """
+        with self._lock:
+            self._stop.set()
+            committed = list(self._committed)
+        cancel.check()
+        audio = self._take_audio()
+        speech = self._vad.has_speech()
+        tail = [w for w, _ in self._decode(audio, committed)] if len(audio) >= SAMPLE_RATE // 4 and speech else []
+        if not speech:
+            log.info("[STT] 流式 跳过静音")
+        log.info(f"[STT] 流式 已确认 {len(committed)} 词，尾部 {len(audio) / SAMPLE_RATE:.1f}s")
+        return "".join(committed + tail).strip()
+
+
+def start_stream(cfg, window_title=""):
+    """按下热键时开启流式转写：tencent_rt 引擎，或 local 引擎且配置 streaming: true"""
+    engine = cfg["stt"]["engine"]
+    if engine == "tencent_rt":
+        return TencentRealtimeStreamer(cfg, _terms(cfg, window_title))
+    if engine == "local" and cfg["stt"]["local"].get("streaming"):
+        return LocalStreamer(cfg, _terms(cfg, window_title))
+    return None
+
+
+_encode_failed = set()
+
+
+def _encode_upload(segment, tc):
+    """按 upload_format 编码上传数据，返回 (VoiceFormat, bytes)；压缩编码不可用时退回 wav"""
+    fmt = tc.get("upload_format", "wav")
+    if fmt in _encode_failed:
+        fmt = "wav"
+    t0 = time.perf_counter()
+    try:
+        data = segment.encode(fmt, tc.get("compression"))
+    except Exception as e:  # 没装 soundfile，或 libsndfile 太旧不支持该格式
+        log.info(f"[STT] {fmt} 编码不可用，改用 wav: {e}")
+        _encode_failed.add(fmt)
+        fmt, data = "wav", segment.to_wav()
+    elapsed = time.perf_counter() - t0
+    raw = len(segment.pcm) * 2 + 44
+    metrics.record("upload_encode", elapsed, fmt=fmt, bytes=len(data), ratio=round(len(data) / raw, 3))
+    if fmt != "wav":
+        log.info(f"[STT] {fmt} {len(data) / 1024:.0f}KB（wav 的 {len(data) / raw:.0%}）编码 {elapsed * 1000:.0f}ms")
+    return fmt, data
+
+
+def transcribe_tencent(segment, cfg, context="", terms=None, backup=False):
+    global _tc_last_used
     tc = cfg["stt"]["tencent"]
+    endpoint = _tc_endpoint(tc, backup)
+    fmt, data = _encode_upload(segment, tc)
     payload = {
         "EngSerViceType": tc.get("engine_type", "16k_zh"),
         "SourceType": 1,
-        "VoiceFormat": "wav",
-        "Data": base64.b64encode(wav_bytes).decode(),
-        "DataLen": len(wav_bytes),
+        "VoiceFormat": fmt,
+        "Data": base64.b64encode(data).decode(),
+        "DataLen": len(data),
     }
-    words = [w for w in cfg["stt"].get("local", {}).get("dictionary", []) if w]
-    if words:
-        payload["HotwordList"] = ",".join(f"{w}|10" for w in words)
+    hotwords = terms.hotwords if terms else cfg.hotwords
+    if hotwords:
+        payload["HotwordList"] = hotwords
 
     payload_str = json.dumps(payload)
     timestamp = int(time.time())
-    signature, scope = _tc3_sign(tc["secret_key"], payload_str, timestamp)
-    host = "asr.tencentcloudapi.com"
+    host = urllib.parse.urlsplit(endpoint).netloc
+    signature, scope = _tc3_sign(tc["secret_key"], payload_str, timestamp, host)
 
-    resp = httpx.post(
-        f"https://{host}",
+    resp = cancel.call(
+        _get_tc_client(cfg).post,
+        endpoint,
         headers={
             "Authorization": f"TC3-HMAC-SHA256 Credential={tc['secret_id']}/{scope}, SignedHeaders=content-type;host, Signature={signature}",
             "Content-Type": "application/json; charset=utf-8",
@@ -150,7 +636,9 @@ def transcribe_tencent(wav_bytes, cfg):
         },
         content=payload_str,
         timeout=30,
+        cleanup=lambda r: r.close(),
     )
+    _tc_last_used = time.monotonic()
     resp.raise_for_status()
     result = resp.json()
     if "Response" in result and "Result" in result["Response"]:
@@ -159,23 +647,365 @@ def transcribe_tencent(wav_bytes, cfg):
     raise RuntimeError(f"腾讯云ASR错误: {err.get('Code')} {err.get('Message')}")
 
 
-_TRANSCRIBERS = {"local": transcribe_local, "tencent": transcribe_tencent}
+# ── 腾讯云实时语音识别（websocket） ──
 
+TC_RT_HOST = "asr.cloud.tencent.com"
 
-def transcribe(wav_bytes, cfg):
-    if _is_silent(wav_bytes):
+
+def _tc_rt_url(cfg, hotwords=""):
+    """实时识别的签名 URL：HMAC-SHA1(secret_key, host/path?排序后的参数)"""
+    tc = cfg["stt"]["tencent"]
+    now = int(time.time())
+    params = {
+        "secretid": tc["secret_id"],
+        "timestamp": now,
+        "expired": now + 3600,
+        "nonce": random.randint(1, 10 ** 9),
+        "engine_model_type": tc.get("engine_type", "16k_zh"),
+        "voice_id": uuid.uuid4().hex,
+        "voice_format": 1,
+        "needvad": 1,
+    }
+    if hotwords:
+        params["hotword_list"] = hotwords
+    path = f"/asr/v2/{tc['appid']}"
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    signature = base64.b64encode(
+        hmac.new(tc["secret_key"].encode(), f"{TC_RT_HOST}{path}?{query}".encode(), hashlib.sha1).digest()).decode()
+    encoded = urllib.parse.urlencode(sorted(params.items()))
+    endpoint = tc.get("rt_endpoint", f"wss://{TC_RT_HOST}")
+    return f"{endpoint}{path}?{encoded}&signature={urllib.parse.quote(signature, safe='')}"
+
+
+class TencentRealtimeStreamer:
+    """按下热键即建立 websocket，录音回调的音频直接推送，边说边收中间/最终结果
+
+    连接失败或中途断开时，finish() 用已缓存的完整音频退回一句话识别。
+    """
+    engine = "tencent_rt"
+
+    def __init__(self, cfg, terms=None):
+        self._cfg = cfg
+        self._terms = terms
+        self._frames = queue.Queue()
+        self._chunks = []
+        self._sentences = {}
+        self._final = threading.Event()
+        self._got_final = False
+        self._error = None
+        self._ws = None
+        self._timeout = cfg["stt"]["tencent"].get("rt_timeout", 3)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def feed(self, chunk):
+        """录音回调线程调用：转成 16bit PCM 入队"""
+        pcm = (chunk.reshape(-1) * 32767).astype(np.int16)
+        self._chunks.append(pcm)
+        self._frames.put(pcm.tobytes())
+
+    def partial(self):
+        return "".join(self._sentences[k] for k in sorted(self._sentences))
+
+    def _run(self):
+        try:
+            from websockets.sync.client import connect
+            t0 = time.perf_counter()
+            hotwords = self._terms.hotwords if self._terms else self._cfg.hotwords
+            with connect(_tc_rt_url(self._cfg, hotwords), open_timeout=self._timeout,
+                         close_timeout=1) as ws:
+                self._ws = ws
+                metrics.record("rt_connect", time.perf_counter() - t0)
+                threading.Thread(target=self._send, args=(ws,), daemon=True).start()
+                for message in ws:
+                    if self._on_message(json.loads(message)):
+                        break
+        except Exception as e:
+            self._error = e
+            log.info(f"[STT] 实时识别连接中断: {e}")
+        finally:
+            self._final.set()
+
+    def _send(self, ws):
+        try:
+            while True:
+                data = self._frames.get()
+                if data is None:
+                    ws.send(json.dumps({"type": "end"}))
+                    return
+                ws.send(data)
+        except Exception as e:
+            self._error = self._error or e
+
+    def _on_message(self, msg):
+        if msg.get("code", 0) != 0:
+            raise RuntimeError(f"腾讯云实时ASR错误: {msg.get('code')} {msg.get('message')}")
+        result = msg.get("result")
+        if result:
+            self._sentences[result.get("index", 0)] = result.get("voice_text_str", "")
+        self._got_final = msg.get("final") == 1
+        return self._got_final
+
+    def _close(self):
+        """后台关闭连接：close() 要等关闭握手，服务端卡住时不能让调用方跟着等"""
+        if self._ws is not None:
+            threading.Thread(target=self._ws.close, daemon=True).start()
+
+    def cancel(self):
+        self._frames.put(None)
+        self._close()
+
+    def finish(self):
+        """结束推流，最多等 rt_timeout 秒最终结果；失败或超时立即退回一句话识别"""
+        self._frames.put(None)
+        if not self._final.wait(self._timeout) or not self._got_final:
+            self._close()
+            cancel.check()
+            log.info(f"[STT] 实时识别未完成，改用一句话识别: {self._error}")
+            pcm = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.int16)
+            return transcribe_tencent(Segment(pcm.astype(np.float32) / 32767), self._cfg, terms=self._terms)
+        return self.partial().strip()
+
+
+def transcribe_tencent_rt(segment, cfg, context="", terms=None):
+    """非流式调用（如单独的片段）：整段推送后取最终结果"""
+    streamer = TencentRealtimeStreamer(cfg, terms)
+    for i in range(0, len(segment.pcm), SAMPLE_RATE // 10):
+        streamer.feed(segment.pcm[i:i + SAMPLE_RATE // 10])
+    return streamer.finish()
+
+
+# fn(segment, cfg, context, terms)：context 是同一会话前文，目前只有本地 whisper 用得上；
+# terms 是本会话挑出的词典子集（prompt/热词），None 时用 cfg 里的默认子集
+_TRANSCRIBERS = {
+    "local": transcribe_local,
+    "tencent": transcribe_tencent,
+    "tencent_backup": lambda segment, cfg, context="", terms=None: transcribe_tencent(
+        segment, cfg, terms=terms, backup=True),
+    "tencent_rt": transcribe_tencent_rt,
+}
+
+
+# ── 对冲：主引擎慢于近期 p95 时并发请求下一个引擎，先返回者胜 ──
+
+class _EngineHealth:
+    """单个引擎的 EWMA 延迟、EWMA 错误率和最近样本的 p95
+
+    延迟按每秒音频的耗时记录（不足 1 秒按 1 秒），长短句可以放在一起比较。
+    """
+    ALPHA = 0.2
+
+    def __init__(self):
+        self.latency = None
+        self.errors = 0.0
+        self._recent = collections.deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def success(self, seconds, audio_sec):
+        rate = seconds / max(audio_sec, 1.0)
+        with self._lock:
+            self.latency = rate if self.latency is None else self.latency + self.ALPHA * (rate - self.latency)
+            self.errors *= 1 - self.ALPHA
+            self._recent.append(rate)
+
+    def censored(self, seconds, audio_sec):
+        """被取消的请求：真实耗时至少是 seconds，只在它比当前估计更慢时计入"""
+        rate = seconds / max(audio_sec, 1.0)
+        with self._lock:
+            if self.latency is not None and rate <= self.latency:
+                return
+            self.latency = rate if self.latency is None else self.latency + self.ALPHA * (rate - self.latency)
+            self._recent.append(rate)
+
+    def failure(self):
+        with self._lock:
+            self.errors += self.ALPHA * (1 - self.errors)
+
+    def p95(self):
+        with self._lock:
+            if len(self._recent) < 5:
+                return None
+            values = sorted(self._recent)
+        return values[min(len(values) - 1, int(0.95 * len(values)))]
+
+    def score(self):
+        """越小越好；还没有成功样本的引擎排在后面"""
+        if self.latency is None:
+            return float("inf")
+        return self.latency * (1 + 4 * self.errors)
+
+
+_health = collections.defaultdict(_EngineHealth)
+_hedge_count = itertools.count(1)
+
+
+def engine_stats():
+    """engine -> {latency, errors, p95}，latency/p95 为每秒音频耗时"""
+    return {name: {"latency": h.latency, "errors": round(h.errors, 3), "p95": h.p95()}
+            for name, h in sorted(_health.items())}
+
+
+def _hedge_order(cfg):
+    engines = cfg["stt"].get("hedge", {}).get("engines") or []
+    return sorted(engines, key=lambda e: (_health[e].score(), _health[e].errors, engines.index(e)))
+
+
+def _hedge_delay(engine, segment, cfg):
+    opts = cfg["stt"].get("hedge", {})
+    lo, hi = opts.get("min_delay", 0.5), opts.get("max_delay", 3.0)
+    p95 = _health[engine].p95()
+    if p95 is None:
+        return hi
+    return min(hi, max(lo, p95 * max(segment.duration, 1.0)))
+
+
+def _attempt(engine, segment, cfg, context, terms, results, token):
+    t0 = time.perf_counter()
+    try:
+        with cancel.bind(token):
+            text = _TRANSCRIBERS[engine](segment, cfg, context, terms)
+    except Exception as e:
+        if token.cancelled:
+            # 输给别的引擎被取消：取消时已耗的时间是真实延迟的下界，主引擎变慢时健康度才跟得上
+            _health[engine].censored(time.perf_counter() - t0, segment.duration)
+        else:
+            _health[engine].failure()
+        results.put((engine, None, e))
+        return
+    elapsed = time.perf_counter() - t0
+    # 输掉的一方如果也跑完了，样本照样有用
+    _health[engine].success(elapsed, segment.duration)
+    metrics.record(f"stt.{engine}", elapsed)
+    results.put((engine, text, None))
+
+
+def _transcribe_hedged(segment, cfg, order, context="", terms=None):
+    """按健康度排序依次发起；出错立即换下一个，超时未返回再并发下一个。返回 (engine, text)"""
+    results = queue.Queue()
+    session = cancel.current()
+    tokens = []
+    launched = 0
+    deadline = None
+    error = None
+
+    def launch():
+        nonlocal launched, deadline
+        engine = order[launched]
+        token = cancel.Token(session)
+        tokens.append(token)
+        threading.Thread(target=_attempt, args=(engine, segment, cfg, context, terms, results, token), daemon=True).start()
+        launched += 1
+        deadline = time.monotonic() + _hedge_delay(engine, segment, cfg)
+
+    launch()
+    running = 1
+    unregister = session.on_cancel(lambda _: results.put((None, None, None))) if session is not None else None
+    try:
+        while running:
+            timeout = max(0.0, deadline - time.monotonic()) if launched < len(order) else None
+            try:
+                engine, text, err = results.get(timeout=timeout)
+            except queue.Empty:
+                log.info(f"[STT] {order[launched - 1]} 超过对冲阈值未返回，并发请求 {order[launched]}")
+                metrics.record("stt_hedge", 0.0, engine=order[launched])
+                launch()
+                running += 1
+                continue
+            if engine is None:
+                cancel.check()  # 会话被取消，子令牌已连带取消
+                continue
+            running -= 1
+            if err is None:
+                for token in tokens:
+                    token.cancel("对冲已有结果")
+                return engine, text
+            error = err
+            log.info(f"[STT] {engine} 失败: {err}")
+            if launched < len(order):
+                launch()
+                running += 1
+        raise error
+    finally:
+        if unregister:
+            unregister()
+        for token in tokens:
+            token.detach()
+
+
+def _trim(segment, cfg):
+    """送识别前去掉首尾静音、压缩句中长停顿，少解码/少上传"""
+    if not (cfg.get("trim") or {}).get("enabled"):
+        return segment
+    with metrics.span("trim"):
+        pcm, removed = vad.trim(segment.pcm, cfg)
+    if not removed:
+        return segment
+    log.info(f"[STT] 裁掉静音 {removed / segment.sample_rate:.1f}s / {segment.duration:.1f}s")
+    return Segment(pcm, segment.sample_rate, segment.has_speech)
+
+
+def transcribe(segment, cfg, context="", window_title=""):
+    """context：同一会话里前几段已识别的文本，本地 whisper 用来衔接上下文
+    window_title：录音时的前台窗口，用来挑选词典子集
+    """
+    if _is_silent(segment, cfg):
         log.info("[STT] 跳过静音")
         return ""
+    segment = _trim(segment, cfg)
     t0 = time.perf_counter()
-    fn = _TRANSCRIBERS[cfg["stt"]["engine"]]
-    for attempt in range(2):
-        try:
-            text = fn(wav_bytes, cfg)
-            break
-        except (httpx.ConnectError, httpx.TimeoutException) as e:
-            if attempt == 0:
-                log.info(f"[STT] 连接失败，重试: {e}")
-                continue
-            raise
-    log.info(f"[STT] ({time.perf_counter() - t0:.2f}s) {text}")
-    return _fix_punct(_t2s.convert(text))
+    terms = _terms(cfg, window_title)
+    order = _hedge_order(cfg)
+    if len(order) > 1:
+        # 备选引擎只有在对冲时才有样本，定期让第二名当一次主引擎，慢下来的主引擎恢复后还能被选回
+        probe = cfg["stt"]["hedge"].get("probe_every", 10)
+        if probe and next(_hedge_count) % probe == 0:
+            order[0], order[1] = order[1], order[0]
+        engine, text = _transcribe_hedged(segment, cfg, order, context, terms)
+    else:
+        engine = cfg["stt"]["engine"]
+        fn = _TRANSCRIBERS[engine]
+        for attempt in range(2):
+            try:
+                text = fn(segment, cfg, context, terms)
+                break
+            except (httpx.ConnectError, httpx.TimeoutException) as e:
+                if attempt == 0:
+                    log.info(f"[STT] 连接失败，重试: {e}")
+                    continue
+                raise
+    elapsed = time.perf_counter() - t0
+    metrics.record("stt", elapsed, engine=engine, audio_sec=round(segment.duration, 2))
+    log.info(f"[STT] {engine} ({elapsed:.2f}s) {text}")
+    return _correct(_normalize(text), cfg)
+
+
+def _get_t2s():
+    global _t2s
+    with _t2s_lock:
+        if _t2s is None:
+            import opencc
+            _t2s = opencc.OpenCC("t2s")
+        return _t2s
+
+
+def _normalize(text):
+    with metrics.span("opencc"):
+        return _fix_punct(_get_t2s().convert(text))
+
+
+def _correct(text, cfg):
+    """按词典拼音纠正同音/近音错字，并记下用到的词条供后续会话挑选"""
+    with metrics.span("dict_correct"):
+        text, fixes = cfg.dictionary.correct(text)
+    if fixes:
+        log.info("[词典] 纠正 " + "，".join(f"{a}→{b}" for a, b in fixes))
+    cfg.dictionary.observe(text)
+    return text
+
+
+def transcribe_stream(streamer):
+    t0 = time.perf_counter()
+    text = streamer.finish()
+    elapsed = time.perf_counter() - t0
+    metrics.record("stt", elapsed, engine=streamer.engine)
+    log.info(f"[STT] 流式 {streamer.engine} ({elapsed:.2f}s) {text}")
+    return _correct(_normalize(text), streamer._cfg)
@@ -0,0 +1,112 @@
+"""STT 对冲：胜者选择、失败切换、健康度（含被取消一方的删失样本）"""
+import collections
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import cancel
+import stt
+from audio import SAMPLE_RATE, Segment
+
+
+@pytest.fixture(autouse=True)
+def health(monkeypatch):
+    h = collections.defaultdict(stt._EngineHealth)
+    monkeypatch.setattr(stt, "_health", h)
+    return h
+
+
+def _engines(monkeypatch, **fns):
+    monkeypatch.setattr(stt, "_TRANSCRIBERS", {name: (lambda f: lambda s, c, ctx, t: f())(fn)
+                                               for name, fn in fns.items()})
+    return {"stt": {"engine": next(iter(fns)),
+                    "hedge": {"engines": list(fns), "min_delay": 0.05, "max_delay": 0.05}}}
+
+
+def _slow(seconds, text):
+    def run():
+        cancel.call(time.sleep, seconds)
+        return text
+    return run
+
+
+def _segment():
+    return Segment(np.zeros(SAMPLE_RATE, dtype=np.float32), has_speech=True)
+
+
+def _wait(cond):
+    for _ in range(200):
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_fast_primary_wins_without_hedging(monkeypatch, health):
+    cfg = _engines(monkeypatch, a=lambda: "甲", b=lambda: "乙")
+    assert stt._transcribe_hedged(_segment(), cfg, ["a", "b"]) == ("a", "甲")
+    assert health["a"].latency is not None
+    assert "b" not in health
+
+
+def test_stalled_primary_loses_and_records_censored_sample(monkeypatch, health):
+    cfg = _engines(monkeypatch, a=_slow(2.0, "甲"), b=_slow(0.1, "乙"))
+    t0 = time.perf_counter()
+    assert stt._transcribe_hedged(_segment(), cfg, ["a", "b"]) == ("b", "乙")
+    assert time.perf_counter() - t0 < 1.0
+    # 输掉的 a 被取消：至少跑了对冲延迟 + b 的耗时，这个下界计入健康度
+    assert _wait(lambda: health["a"].latency is not None)
+    assert health["a"].latency >= 0.1
+    assert health["a"].errors == 0
+    assert stt._hedge_order(cfg) == ["b", "a"]
+
+
+def test_error_fails_over_and_counts_failure(monkeypatch, health):
+    def broken():
+        raise RuntimeError("boom")
+    cfg = _engines(monkeypatch, a=broken, b=lambda: "乙")
+    assert stt._transcribe_hedged(_segment(), cfg, ["a", "b"]) == ("b", "乙")
+    assert health["a"].errors > 0
+    assert health["a"].latency is None
+
+
+def test_all_engines_fail_raises_last_error(monkeypatch):
+    def broken():
+        raise RuntimeError("boom")
+    cfg = _engines(monkeypatch, a=broken, b=broken)
+    with pytest.raises(RuntimeError):
+        stt._transcribe_hedged(_segment(), cfg, ["a", "b"])
+
+
+def test_session_cancel_stops_hedge_and_unregisters(monkeypatch):
+    session = cancel.Token()
+    cfg = _engines(monkeypatch, a=lambda: "甲", b=lambda: "乙")
+    with cancel.bind(session):
+        stt._transcribe_hedged(_segment(), cfg, ["a", "b"])
+    assert session._callbacks == []  # 正常返回后不留回调
+    cfg = _engines(monkeypatch, a=_slow(2.0, "甲"), b=_slow(2.0, "乙"))
+    with cancel.bind(session):
+        threading.Timer(0.1, session.cancel, args=("esc",)).start()
+        with pytest.raises(cancel.Cancelled):
+            stt._transcribe_hedged(_segment(), cfg, ["a", "b"])
+
+
+def test_censored_sample_never_lowers_latency():
+    h = stt._EngineHealth()
+    h.success(2.0, 1.0)
+    h.censored(0.5, 1.0)
+    assert h.latency == 2.0
+    h.censored(4.0, 1.0)
+    assert h.latency > 2.0
+
+
+def test_health_order_prefers_lower_latency_and_fewer_errors(health):
+    cfg = {"stt": {"hedge": {"engines": ["a", "b", "c"]}}}
+    health["a"].success(1.0, 1.0)
+    health["b"].success(0.5, 1.0)
+    assert stt._hedge_order(cfg) == ["b", "a", "c"]  # c 没有样本排最后
+    for _ in range(10):
+        health["b"].failure()
+    assert stt._hedge_order(cfg)[0] == "a"
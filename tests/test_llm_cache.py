@@ -0,0 +1,46 @@
+"""LLM 润色缓存：put 不写盘，合并后后台落盘，重新加载能读回"""
+import os
+import threading
+import time
+
+import llm
+
+
+def test_put_is_memory_only_and_flushes_later(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm._PolishCache, "SAVE_DELAY_SEC", 0.05)
+    path = str(tmp_path / "cache.json")
+    cache = llm._PolishCache(path, 100, ["p"])
+    key = cache.key("m", "p", "文本")
+    cache.put(key, "p", "结果")
+    assert not os.path.exists(path)
+    assert cache.get(key) == "结果"
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.01)
+    assert llm._PolishCache(path, 100, ["p"]).get(key) == "结果"
+
+
+def test_concurrent_puts_and_flush(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = llm._PolishCache(path, 1000, ["p"])
+
+    def write(i):
+        for j in range(50):
+            cache.put(cache.key("m", "p", f"{i}-{j}"), "p", f"{i}-{j}")
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cache.flush()
+    assert sorted(os.listdir(tmp_path)) == ["cache.json"]
+    assert llm._PolishCache(path, 1000, ["p"]).get(cache.key("m", "p", "7-49")) == "7-49"
+
+
+def test_dropped_prompt_invalidates_entries(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = llm._PolishCache(path, 100, ["旧"])
+    cache.put(cache.key("m", "旧", "文本"), "旧", "结果")
+    cache.flush()
+    assert llm._PolishCache(path, 100, ["新"]).get(cache.key("m", "旧", "文本")) is None
@@ -0,0 +1,77 @@
+"""本地流式转写：按住不说话时不解码；松开时不等进行中的窗口解码"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import stt
+from audio import SAMPLE_RATE
+from config import Config
+
+BLOCK = 1024
+
+
+class FakeModel:
+    """delay 模拟逐段解码的耗时（faster-whisper 的 segments 是惰性生成器）"""
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+
+    def transcribe(self, audio, **_):
+        self.calls += 1
+
+        def segments():
+            time.sleep(self.delay)
+            yield SimpleNamespace(words=[SimpleNamespace(word="字", end=len(audio) / SAMPLE_RATE)])
+        return segments(), None
+
+
+@pytest.fixture
+def model(monkeypatch):
+    m = FakeModel()
+    monkeypatch.setattr(stt, "_get_model", lambda cfg: m)
+    return m
+
+
+def _hold(blocks):
+    streamer = stt.LocalStreamer(Config({"stt": {"local": {"stream_interval": 0.05}}}))
+    for block in blocks:
+        streamer.feed(block)
+        time.sleep(0.002)
+    time.sleep(0.2)
+    return streamer.finish()
+
+
+def _tone():
+    t = np.arange(BLOCK) / SAMPLE_RATE
+    return (0.2 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+def test_silent_hold_never_decodes(model):
+    assert _hold([np.zeros(BLOCK, dtype=np.float32)] * 40) == ""
+    assert model.calls == 0
+
+
+def test_speech_is_decoded(model):
+    silence = np.zeros(BLOCK, dtype=np.float32)
+    assert _hold([silence] * 5 + [_tone()] * 35) != ""
+    assert model.calls > 0
+
+
+def test_finish_does_not_wait_for_inflight_window_decode(monkeypatch):
+    model = FakeModel(delay=1.0)
+    monkeypatch.setattr(stt, "_get_model", lambda cfg: model)
+    streamer = stt.LocalStreamer(Config({"stt": {"local": {"stream_interval": 0.05}}}))
+    for block in [np.zeros(BLOCK, dtype=np.float32)] * 5 + [_tone()] * 35:
+        streamer.feed(block)
+    for _ in range(100):
+        if model.calls:
+            break
+        time.sleep(0.01)
+    assert model.calls == 1  # 后台窗口解码进行中
+    model.delay = 0.05
+    t0 = time.perf_counter()
+    assert streamer.finish() == "字"
+    assert time.perf_counter() - t0 < 0.5
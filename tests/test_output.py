@@ -0,0 +1,82 @@
+"""剪贴板输出：选区捕获的提前返回/超时，粘贴后的恢复（FakeClipboard）"""
+import time
+
+import pytest
+
+import output
+
+
+@pytest.fixture
+def cb(monkeypatch):
+    fake = output.FakeClipboard("原内容")
+    monkeypatch.setattr(output, "clipboard", fake)
+    monkeypatch.setattr(output, "RESTORE_DELAY_SEC", 0.05)
+    monkeypatch.setattr(output, "_restore", None)
+    monkeypatch.setattr(output, "_last_paste", 0.0)
+    return fake
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def test_copy_selection_returns_as_soon_as_clipboard_changes(cb):
+    cb.app_delay = 0.02
+    cb.selection = "选中的文字"
+    text, elapsed = _timed(output.copy_selection, cb.send_copy, timeout=1.0)
+    assert text == "选中的文字"
+    assert elapsed < 0.2
+
+
+def test_copy_selection_without_selection_times_out(cb):
+    text, elapsed = _timed(output.copy_selection, cb.send_copy, timeout=0.05)
+    assert text is None
+    assert 0.05 <= elapsed < 0.2
+    assert cb.paste() == "原内容"
+
+
+def _writes(cb):
+    writes = []
+    copy = cb.copy
+
+    def record(text):
+        writes.append(text)
+        copy(text)
+    cb.copy = record
+    return writes
+
+
+def test_paste_restores_clipboard_once(cb):
+    writes = _writes(cb)
+    pasted = []
+    _, elapsed = _timed(output.type_text, "结果", send_paste=lambda _: pasted.append(cb.paste()))
+    assert pasted == ["结果"]
+    assert elapsed < 0.03
+    time.sleep(0.15)
+    assert cb.paste() == "原内容"
+    assert writes == ["结果", "原内容"]
+
+
+def test_back_to_back_pastes_keep_original_and_settle(cb):
+    writes = _writes(cb)
+    pasted = []
+
+    def send(_):
+        pasted.append((cb.paste(), time.monotonic()))
+    for piece in ("第一句。", "第二句。", "第三句。"):
+        output.type_text(piece, send_paste=send)
+    assert [p for p, _ in pasted] == ["第一句。", "第二句。", "第三句。"]
+    gaps = [b - a for (_, a), (_, b) in zip(pasted, pasted[1:])]
+    assert min(gaps) >= output.PASTE_SETTLE_SEC - 0.005
+    time.sleep(0.15)
+    assert cb.paste() == "原内容"
+    assert writes.count("原内容") == 1
+
+
+def test_user_copy_during_paste_is_not_overwritten(cb):
+    output.type_text("结果", send_paste=lambda _: None)
+    cb.copy("用户复制的")
+    time.sleep(0.15)
+    assert cb.paste() == "用户复制的"
@@ -0,0 +1,86 @@
+"""SessionAssembler 按会话/段顺序重组；Processor 对空会话的收尾"""
+import threading
+
+import numpy as np
+import pytest
+
+from audio import SAMPLE_RATE, Segment
+from pipeline import Processor, SessionAssembler
+
+
+def _collect(incremental):
+    out = []
+    return out, SessionAssembler(lambda sid, ctx, text: out.append((sid, text)), incremental)
+
+
+def test_whole_sessions_in_open_order():
+    out, a = _collect(False)
+    a.open(1)
+    a.open(2)
+    a.add(2, 1, "乙")
+    a.close(2, 1)
+    a.add(1, 2, "二")
+    a.close(1, 2)
+    assert out == []  # 会话 1 还缺第 1 段，会话 2 排在后面等着
+    a.add(1, 1, "一")
+    assert out == [(1, "一二"), (2, "乙")]
+    assert a.pending() == 0
+
+
+def test_incremental_emits_segments_in_order():
+    out, a = _collect(True)
+    a.open(1)
+    a.add(1, 2, "二")
+    assert out == []
+    a.add(1, 1, "一")
+    assert out == [(1, "一"), (1, "二")]
+    a.close(1, 2)
+    assert a.pending() == 0
+
+
+def test_incremental_partial_is_not_repeated():
+    out, a = _collect(True)
+    a.open(1)
+    a.add_partial(1, 1, "今天")
+    a.add(1, 1, "今天天气")
+    a.close(1, 1)
+    assert "".join(text for _, text in out) == "今天天气"
+    assert a.pending() == 0
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_empty_session_completes_and_unblocks_next(incremental):
+    out, a = _collect(incremental)
+    a.open(1)
+    a.open(2)
+    a.add(2, 1, "乙")
+    a.close(2, 1)
+    a.close(1, 0)
+    assert (1, "") in out
+    assert [sid for sid, text in out if text] == [2]
+    assert a.pending() == 0
+
+
+def test_drop_releases_following_sessions():
+    out, a = _collect(False)
+    a.open(1)
+    a.open(2)
+    a.add(2, 1, "乙")
+    a.close(2, 1)
+    a.drop(1)
+    assert out == [(2, "乙")]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_processor_forgets_empty_session(incremental):
+    emitted = threading.Event()
+    proc = Processor(lambda job: "", lambda job, on_text: job.text, lambda *a: emitted.set(),
+                     incremental=incremental)
+    try:
+        proc.begin()
+        assert proc.end(Segment(np.zeros(SAMPLE_RATE // 10, dtype=np.float32))) == 0
+        assert emitted.wait(1)
+        assert proc.pending() == 0
+        assert not proc.sessions
+    finally:
+        proc.stop()
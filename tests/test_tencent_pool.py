@@ -0,0 +1,62 @@
+"""腾讯云一句话识别的连接复用和预热（本地替身服务统计 TCP 连接数）"""
+import time
+
+import numpy as np
+import pytest
+
+import stt
+from audio import SAMPLE_RATE, Segment
+from config import Config
+from fake_servers import FakeTencentASR
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeTencentASR(latency=0.01, jitter=0.0)
+    monkeypatch.setattr(stt, "_tc_client", None)
+    monkeypatch.setattr(stt, "_tc_last_used", 0.0)
+    yield fake
+    if stt._tc_client is not None:
+        stt._tc_client.close()
+    fake.stop()
+
+
+def _cfg(fake):
+    return Config({"stt": {"engine": "tencent",
+                           "tencent": {"secret_id": "x", "secret_key": "x", "endpoint": fake.url}}})
+
+
+def _segment():
+    return Segment(np.zeros(SAMPLE_RATE, dtype=np.float32), has_speech=True)
+
+
+def test_requests_reuse_one_connection(server):
+    cfg = _cfg(server)
+    for _ in range(5):
+        assert stt.transcribe_tencent(_segment(), cfg) == "今天天气不错，我们去公园散步吧。"
+    assert server.requests == 5
+    assert server.connections == 1
+
+
+def test_warm_connection_is_used_by_first_request(server):
+    cfg = _cfg(server)
+    stt._warm_tencent(cfg)
+    assert server.connections == 1
+    stt.transcribe_tencent(_segment(), cfg)
+    assert server.connections == 1
+
+
+def test_prewarm_skips_recently_used_connection(server, monkeypatch):
+    cfg = _cfg(server)
+    stt.transcribe_tencent(_segment(), cfg)
+    warmed = []
+    monkeypatch.setattr(stt, "_warm_tencent", warmed.append)
+    stt.prewarm(cfg)
+    assert warmed == []
+    monkeypatch.setattr(stt, "_tc_last_used", 0.0)
+    stt.prewarm(cfg)
+    for _ in range(100):
+        if warmed:
+            break
+        time.sleep(0.01)
+    assert warmed == [cfg]
@@ -0,0 +1,61 @@
+"""腾讯云实时识别：本地 websocket 替身上的正常结束、中途断开、服务端卡住"""
+import time
+
+import numpy as np
+import pytest
+
+import stt
+from audio import SAMPLE_RATE
+from config import Config
+from fake_servers import FakeTencentASR, FakeTencentRealtime
+
+pytest.importorskip("websockets")
+
+RT_TEXT = "实时识别的结果。"
+ONE_SHOT_TEXT = "今天天气不错，我们去公园散步吧。"
+
+
+@pytest.fixture
+def one_shot(monkeypatch):
+    fake = FakeTencentASR(latency=0.01, jitter=0.0)
+    monkeypatch.setattr(stt, "_tc_client", None)
+    yield fake
+    if stt._tc_client is not None:
+        stt._tc_client.close()
+    fake.stop()
+
+
+def _run(one_shot, seconds=2.0, **rt_opts):
+    rt = FakeTencentRealtime(text=RT_TEXT, **rt_opts)
+    cfg = Config({"stt": {"engine": "tencent_rt", "tencent": {
+        "secret_id": "x", "secret_key": "x", "appid": "1", "rt_timeout": 1,
+        "endpoint": one_shot.url, "rt_endpoint": rt.url}}})
+    streamer = stt.start_stream(cfg)
+    chunk = np.zeros(SAMPLE_RATE // 10, dtype=np.float32)
+    for _ in range(int(seconds * 10)):
+        streamer.feed(chunk)
+        time.sleep(0.01)
+    t0 = time.perf_counter()
+    try:
+        return streamer, streamer.finish(), time.perf_counter() - t0, rt
+    finally:
+        rt.stop()
+
+
+def test_final_result_with_partials(one_shot):
+    streamer, text, _, rt = _run(one_shot, partial_every=2)
+    assert text == RT_TEXT
+    assert rt.frames == 20
+    assert one_shot.requests == 0
+
+
+def test_disconnect_falls_back_to_one_shot(one_shot):
+    _, text, _, rt = _run(one_shot, disconnect_after=5)
+    assert text == ONE_SHOT_TEXT
+    assert one_shot.requests == 1
+
+
+def test_stalled_server_falls_back_within_rt_timeout(one_shot):
+    _, text, elapsed, _ = _run(one_shot, connect_delay=4)
+    assert text == ONE_SHOT_TEXT
+    assert elapsed < 2.0  # rt_timeout 1 秒 + 一句话识别
@@ -0,0 +1,31 @@
+"""送识别前裁剪：句中长停顿压缩到 max_pause"""
+import numpy as np
+
+import vad
+from audio import SAMPLE_RATE
+from eval_vad import syllable
+
+HANGOVER = 0.3
+
+
+def _speech(rng, seconds):
+    out, n = [], 0
+    while n < seconds * SAMPLE_RATE:
+        syl = syllable(rng, 0.1)
+        out += [syl, np.zeros(int(0.03 * SAMPLE_RATE))]
+        n += len(syl) + int(0.03 * SAMPLE_RATE)
+    return np.concatenate(out)
+
+
+def test_long_pause_is_capped_at_max_pause():
+    rng = np.random.default_rng(0)
+    parts = [np.zeros(SAMPLE_RATE), _speech(rng, 1.5), np.zeros(3 * SAMPLE_RATE), _speech(rng, 1.5),
+             np.zeros(SAMPLE_RATE)]
+    audio = np.concatenate(parts).astype(np.float32)
+    audio += (0.001 * rng.standard_normal(len(audio))).astype(np.float32)
+    out, removed = vad.trim(audio)
+    assert removed > 3 * SAMPLE_RATE
+    spans = vad.speech_spans(out)
+    assert len(spans) == 2
+    pause = (spans[1][0] - spans[0][1]) / SAMPLE_RATE + HANGOVER
+    assert 0.4 <= pause <= 0.6 + 0.05
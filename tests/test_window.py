@@ -0,0 +1,60 @@
+"""前台窗口跟踪：空闲时降低轮询频率，按键时快的 provider 拿新快照、慢的不等"""
+import time
+
+from window import FakeProvider, WindowTracker
+
+
+class CountingProvider(FakeProvider):
+    def __init__(self, delay=0.0):
+        super().__init__("app", "标题")
+        self.delay = delay
+        self.calls = 0
+
+    def get(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return super().get()
+
+
+def _wait_first(tracker):
+    for _ in range(100):
+        if tracker._cost is not None:
+            return
+        time.sleep(0.01)
+
+
+def test_idle_tracker_polls_slowly():
+    provider = CountingProvider()
+    tracker = WindowTracker(provider)
+    try:
+        time.sleep(0.3)  # FakeProvider 间隔 0.01 秒，活跃时会查几十次
+        assert provider.calls <= 2
+        tracker.poke()
+        time.sleep(0.3)
+        assert provider.calls > 10
+    finally:
+        tracker.stop()
+
+
+def test_get_fresh_sees_switch_with_fast_provider():
+    provider = CountingProvider()
+    tracker = WindowTracker(provider)
+    try:
+        _wait_first(tracker)
+        provider.set("term", "新窗口")
+        proc, title, age = tracker.get_fresh()
+        assert (proc, title) == ("term", "新窗口")
+    finally:
+        tracker.stop()
+
+
+def test_get_fresh_does_not_wait_for_slow_provider():
+    provider = CountingProvider(delay=0.2)
+    tracker = WindowTracker(provider)
+    try:
+        _wait_first(tracker)
+        t0 = time.perf_counter()
+        assert tracker.get_fresh()[:2] == ("app", "标题")
+        assert time.perf_counter() - t0 < 0.02
+    finally:
+        tracker.stop()
@@ -0,0 +1,193 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class EnergyVAD:
+    """能量 VAD：自适应噪声底 + 挂起（hangover），逐帧输出语音概率
+
+    帧能量（dB）相对噪声底的余量经 sigmoid 映射为概率；噪声底遇到更低能量时快速下降，
+    否则缓慢上升，从而跟随房间底噪。
+    """
+
+    def __init__(self, frame=512, margin_db=9.0, slope_db=2.0, hangover=0.3,
+                 floor_rise_db=0.05, floor_init_db=-60.0, min_db=-65.0):
+        self.frame = frame
+        self.margin_db = margin_db
+        self.slope_db = slope_db
+        self.hangover = int(hangover * SAMPLE_RATE / frame)
+        self.floor_rise_db = floor_rise_db
+        self.floor_init_db = floor_init_db
+        self.min_db = min_db
+        self.reset()
+
+    def reset(self):
+        self.floor = None
+        self._hang = 0
+        self._rest = np.zeros(0, dtype=np.float32)
+
+    def _frames(self, audio):
+        audio = np.concatenate([self._rest, audio.reshape(-1)])
+        n = len(audio) // self.frame
+        self._rest = audio[n * self.frame:]
+        return audio[:n * self.frame].reshape(n, self.frame)
+
+    def probs(self, audio):
+        """返回每帧的语音概率（不含挂起）"""
+        frames = self._frames(audio)
+        if not len(frames):
+            return np.zeros(0, dtype=np.float32)
+        db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        if self.floor is None:
+            self.floor = max(float(np.min(db)), self.floor_init_db)
+        # 噪声底是递推量，只能逐帧更新；概率计算保持向量化
+        floors = np.empty_like(db)
+        floor = self.floor
+        for i, d in enumerate(db):
+            if d > floor:
+                # 疑似语音时上升更慢，避免长句把噪声底抬高
+                rise = self.floor_rise_db if d - floor < self.margin_db else self.floor_rise_db / 10
+                floor = min(d, floor + rise)
+            else:
+                floor = 0.5 * (floor + d)
+            floors[i] = floor
+        self.floor = floor
+        p = 1 / (1 + np.exp(-(db - floors - self.margin_db) / self.slope_db))
+        p[db < self.min_db] = 0
+        return p
+
+    def process(self, audio):
+        """返回每帧是否为语音（含挂起）"""
+        speech = self.probs(audio) > 0.5
+        for i, s in enumerate(speech):
+            if s:
+                self._hang = self.hangover
+            elif self._hang > 0:
+                self._hang -= 1
+                speech[i] = True
+        return speech
+
+
+class WebrtcVAD:
+    """webrtcvad 后端（需 pip install webrtcvad），概率只有 0/1"""
+
+    def __init__(self, aggressiveness=2, hangover=0.3, **_):
+        import webrtcvad
+        self.frame = 480
+        self._vad = webrtcvad.Vad(aggressiveness)
+        self.hangover = int(hangover * SAMPLE_RATE / self.frame)
+        self.reset()
+
+    def reset(self):
+        self._hang = 0
+        self._rest = np.zeros(0, dtype=np.float32)
+
+    _frames = EnergyVAD._frames
+
+    def probs(self, audio):
+        frames = (self._frames(audio) * 32767).astype(np.int16)
+        return np.array([float(self._vad.is_speech(f.tobytes(), SAMPLE_RATE)) for f in frames])
+
+    process = EnergyVAD.process
+
+
+_VADS = {"energy": EnergyVAD, "webrtc": WebrtcVAD}
+
+
+def create(cfg=None):
+    """按 config.yaml 的 vad 段创建 VAD 实例"""
+    opts = dict((cfg or {}).get("vad") or {})
+    engine = opts.pop("engine", "energy")
+    for k in ("min_speech", "silence", "min_duration"):
+        opts.pop(k, None)
+    return _VADS[engine](**opts)
+
+
+class Cutter:
+    """分段判定：超过 min_duration 秒后遇到 silence 秒静音即切割，同时统计语音时长
+
+    Recorder 的静音切割和 STT 前的静音跳过都用它，VAD 只算一次。
+    """
+
+    def __init__(self, vad, min_duration=6.0, silence=0.8, min_speech=0.2):
+        self.vad = vad
+        self._min = int(min_duration * SAMPLE_RATE)
+        self._silence_limit = int(silence * SAMPLE_RATE)
+        self._min_speech = int(min_speech * SAMPLE_RATE)
+        self.reset()
+
+    @staticmethod
+    def from_config(cfg):
+        opts = (cfg or {}).get("vad") or {}
+        return Cutter(create(cfg), opts.get("min_duration", 6.0), opts.get("silence", 0.8),
+                      opts.get("min_speech", 0.2))
+
+    def reset(self):
+        self.samples = 0
+        self.speech = 0
+        self._silence = 0
+
+    def has_speech(self):
+        return self.speech >= self._min_speech
+
+    def feed(self, audio):
+        """喂入一块音频，返回是否应在此处切割"""
+        flags = self.vad.process(audio)
+        n = len(audio.reshape(-1))
+        self.samples += n
+        voiced = int(np.count_nonzero(flags)) * self.vad.frame
+        self.speech += voiced
+        self._silence = 0 if voiced else self._silence + n
+        return self.samples > self._min and self._silence >= self._silence_limit
+
+
+def has_speech(audio, cfg=None):
+    """整段音频的离线判定，用于没有录音端统计的片段"""
+    cutter = Cutter.from_config(cfg)
+    cutter.feed(audio)
+    return cutter.has_speech()
+
+
+def speech_spans(audio, cfg=None):
+    """整段音频的语音区间 [(start, end)]，单位样本（含挂起）"""
+    detector = create(cfg)
+    flags = detector.process(audio)
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], flags, [False]]).astype(np.int8)))
+    return [(int(s) * detector.frame, int(e) * detector.frame) for s, e in zip(edges[::2], edges[1::2])]
+
+
+def keep_spans(audio, cfg=None):
+    """trim 要保留的区间 [(start, end)]：首尾语音外各留 margin 秒，句中停顿最多留 max_pause 秒
+
+    VAD 区间的结尾已含挂起（hangover），停顿从挂起开始算：下一句前留 margin，其余留在挂起之后。
+    """
+    opts = (cfg or {}).get("trim") or {}
+    margin = int(opts.get("margin", 0.2) * SAMPLE_RATE)
+    max_pause = int(opts.get("max_pause", 0.6) * SAMPLE_RATE)
+    hangover = int((((cfg or {}).get("vad") or {}).get("hangover", 0.3)) * SAMPLE_RATE)
+    lead = min(margin, max_pause)
+    after = max(0, max_pause - lead - hangover)
+    # 保留的都是原始音频里的底噪，不插入数字静音
+    spans = []
+    for s, e in speech_spans(audio, cfg):
+        if spans and s - spans[-1][1] <= lead + after:
+            spans[-1][1] = e
+            continue
+        if spans:
+            spans[-1][1] += after
+        spans.append([max(0, s - (lead if spans else margin)), e])
+    if spans:
+        spans[-1][1] = min(len(audio), spans[-1][1] + margin)
+    return [(s, e) for s, e in spans]
+
+
+def trim(audio, cfg=None):
+    """去掉首尾静音、压缩句中长停顿，返回 (音频, 去掉的样本数)
+
+    没有检出语音或无需裁剪时原样返回，不复制。
+    """
+    spans = keep_spans(audio, cfg)
+    if not spans or spans == [(0, len(audio))]:
+        return audio, 0
+    out = np.concatenate([audio[s:e] for s, e in spans])
+    return out, len(audio) - len(out)
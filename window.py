@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+
+log = logging.getLogger("voice")
+
+SYSTEM = platform.system()
+
+
+class MacProvider:
+    """osascript 一次取前台进程名和窗口标题"""
+    interval = 0.5
+    _SCRIPT = '''
+    tell application "System Events"
+        set fp to first application process whose frontmost is true
+        set pname to name of fp
+        try
+            set wtitle to name of front window of fp
+        on error
+            set wtitle to ""
+        end try
+    end tell
+    return pname & linefeed & wtitle
+    '''
+
+    def get(self):
+        out = subprocess.check_output(["osascript", "-e", self._SCRIPT],
+                                      stderr=subprocess.DEVNULL, timeout=2).decode()
+        proc, _, title = out.rstrip("\n").partition("\n")
+        return proc.strip().lower(), title.strip()
+
+
+class WindowsProvider:
+    interval = 0.1
+
+    def get(self):
+        import ctypes
+        from ctypes import wintypes
+        hwnd = ctypes.windll.user32.GetForegroundWindow()
+        pid = wintypes.DWORD()
+        ctypes.windll.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        handle = ctypes.windll.kernel32.OpenProcess(0x0400 | 0x0010, False, pid.value)
+        buf = ctypes.create_unicode_buffer(260)
+        ctypes.windll.psapi.GetModuleFileNameExW(handle, None, buf, 260)
+        ctypes.windll.kernel32.CloseHandle(handle)
+        proc_name = os.path.basename(buf.value).lower()
+        length = ctypes.windll.user32.GetWindowTextLengthW(hwnd)
+        tbuf = ctypes.create_unicode_buffer(length + 1)
+        ctypes.windll.user32.GetWindowTextW(hwnd, tbuf, length + 1)
+        return proc_name, tbuf.value
+
+
+def _proc_name(pid):
+    try:
+        with open(f"/proc/{int(pid)}/comm", encoding="utf-8") as f:
+            return f.read().strip().lower()
+    except (OSError, ValueError):
+        return ""
+
+
+def _sway_focused(node):
+    if node.get("focused"):
+        return node
+    for child in node.get("nodes", []) + node.get("floating_nodes", []):
+        found = _sway_focused(child)
+        if found:
+            return found
+    return None
+
+
+class LinuxProvider:
+    """X11 用 xdotool，Wayland 支持 sway (swaymsg) 和 Hyprland (hyprctl)"""
+    interval = 0.2
+
+    def __init__(self):
+        wayland = os.environ.get("WAYLAND_DISPLAY")
+        if wayland and shutil.which("hyprctl") and os.environ.get("HYPRLAND_INSTANCE_SIGNATURE"):
+            self.get = self._hyprland
+        elif wayland and shutil.which("swaymsg") and os.environ.get("SWAYSOCK"):
+            self.get = self._sway
+        elif os.environ.get("DISPLAY") and shutil.which("xdotool"):
+            self.get = self._x11
+        else:
+            raise RuntimeError("未找到 xdotool / swaymsg / hyprctl")
+
+    @staticmethod
+    def _run(*cmd):
+        return subprocess.check_output(cmd, stderr=subprocess.DEVNULL, timeout=1).decode().strip()
+
+    def _x11(self):
+        wid = self._run("xdotool", "getactivewindow")
+        title = self._run("xdotool", "getwindowname", wid)
+        return _proc_name(self._run("xdotool", "getwindowpid", wid)), title
+
+    def _sway(self):
+        node = _sway_focused(json.loads(self._run("swaymsg", "-t", "get_tree"))) or {}
+        return _proc_name(node.get("pid", 0)), node.get("name") or ""
+
+    def _hyprland(self):
+        win = json.loads(self._run("hyprctl", "activewindow", "-j") or "{}")
+        return _proc_name(win.get("pid", 0)), win.get("title", "")
+
+
+class FakeProvider:
+    """测试用：set() 设置当前窗口"""
+    interval = 0.01
+
+    def __init__(self, proc="", title=""):
+        self._value = (proc, title)
+
+    def set(self, proc, title):
+        self._value = (proc, title)
+
+    def get(self):
+        return self._value
+
+
+class NullProvider:
+    interval = 60
+
+    def get(self):
+        return "", ""
+
+
+def default_provider():
+    try:
+        if SYSTEM == "Darwin":
+            return MacProvider()
+        if SYSTEM == "Windows":
+            return WindowsProvider()
+        return LinuxProvider()
+    except Exception as e:
+        log.info(f"[窗口] 无法获取前台窗口: {e}")
+        return NullProvider()
+
+
+class WindowTracker:
+    """后台轮询前台窗口，热键按下时直接返回缓存的快照，不阻塞键盘回调
+
+    get() 返回 (进程名, 标题, 快照已过去的秒数)。最近 ACTIVE_SEC 秒内按过热键才按
+    provider 的间隔轮询，平时每 IDLE_INTERVAL_SEC 秒查一次，空闲时不频繁起子进程。
+    """
+    FRESH_WAIT_SEC = 0.05  # 按下热键时最多等多久拿新快照
+    ACTIVE_SEC = 30.0
+    IDLE_INTERVAL_SEC = 5.0
+
+    def __init__(self, provider=None, interval=None):
+        self._provider = provider or default_provider()
+        self._interval = interval or self._provider.interval
+        self._snapshot = ("", "", 0.0)
+        self._cost = None  # 最近几次查询耗时的 EWMA
+        self._active_until = 0.0
+        self._updated = threading.Condition()
+        self._wake = threading.Event()
+        self._stopped = False
+        # 第一次取窗口也放到后台（macOS 的 osascript 要上百毫秒），不拖慢启动
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _refresh(self):
+        at = time.monotonic()  # 快照时间记开始查询的时刻，get_fresh 据此判断是否在按键之后
+        try:
+            proc, title = self._provider.get()
+        except Exception:
+            proc, title = "", ""
+        cost = time.monotonic() - at
+        self._cost = cost if self._cost is None else self._cost + 0.3 * (cost - self._cost)
+        with self._updated:
+            self._snapshot = (proc, title, at)
+            self._updated.notify_all()
+
+    def _run(self):
+        while not self._stopped:
+            self._refresh()
+            active = time.monotonic() < self._active_until
+            self._wake.wait(self._interval if active else max(self._interval, self.IDLE_INTERVAL_SEC))
+            self._wake.clear()
+
+    def get(self):
+        proc, title, at = self._snapshot
+        return proc, title, time.monotonic() - at
+
+    def poke(self):
+        """立刻刷新一次（不等待结果），之后 ACTIVE_SEC 秒内按正常间隔轮询"""
+        self._active_until = time.monotonic() + self.ACTIVE_SEC
+        self._wake.set()
+
+    def get_fresh(self, timeout=FRESH_WAIT_SEC):
+        """立刻刷新，最多等 timeout 秒拿到按下之后的快照
+
+        查询本来就比 timeout 慢（如 macOS osascript）时不等，直接返回缓存的快照。
+        """
+        since = time.monotonic()
+        self.poke()
+        if self._cost is not None and self._cost > timeout:
+            return self.get()
+        with self._updated:
+            self._updated.wait_for(lambda: self._snapshot[2] >= since, timeout)
+        return self.get()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()